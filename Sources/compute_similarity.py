@@ -1,49 +1,135 @@
-import nltk
+from collections import Counter
 import settings
 import editdistance
-from utterance import Utterance
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
 
 
-def get_data(row1, row2, vocabulary_gloss, model, fw, precondition):
+# integer id of every token met during the run, see Utterance.get_token_ids()
+token_vocabulary = {}
+
+
+def get_result_schema(thresholds = (1, 3, 10, 20, 50)):
 
     """
-        Pre-process data, creates embedding, part of speech, etc... of row1 and row2,
-        computes linguistic similarities between both utterances, return these measures
-        and complementary information in a dictionnary.
+        The columns of the results, in order, with the type of their values. It is the single
+        definition of the results: get_data() returns a value for each of these columns,
+        and the results tables are written and checked according to it (see storage.ResultSink)
+
+        :param thresholds: The thresholds of the ages of acquisition, there are two columns
+        for each of them (see out_of_child_vocab())
+        :type thresholds: int list
+
+        :returns: The type of each column: "str", "int", "float" or "str_list", in order
+        :rtype: dict{str:str}
+    """
+
+    return {"condition": "str",
+          "sample": "int",
+          "child_age": "int",
+          "child_sex": "str",
+          "child_id": "int",
+          "parent_sex": "str",
+          "child_utterance_order": "int",
+          "adult_utterance_order": "int",
+          "child_transcript_id": "int",
+          "adult_transcript_id": "int",
+          "child_corpus_name": "str",
+          "adult_corpus_name": "str",
+
+          "semantic_similarity": "float",
+          "editdistance": "int",
+
+          "child_utt": "str",
+          "adult_utt": "str",
+
+          "child_tokens": "str_list",
+          "adult_tokens": "str_list",
+
+          "child_tokens_nbr": "int",
+          "adult_tokens_nbr": "int",
+
+          "child_num_morphemes": "int",
+          "adult_num_morphemes": "int",
+
+          "child_pos": "str_list",
+          "adult_pos": "str_list",
+
+          "child_pos_nbr": "int",
+          "adult_pos_nbr": "int",
+
+          "child_unknown_words": "str_list",
+          "adult_unknown_words": "str_list",
+
+          "child_unknown_words_nbr": "int",
+          "adult_unknown_words_nbr": "int",
+
+          "child_stopwords": "str_list",
+          "adult_stopwords": "str_list",
+
+          "child_stopwords_nbr": "int",
+          "adult_stopwords_nbr": "int",
+
+          "child_final_tokens": "str_list",
+          "adult_final_tokens": "str_list",
+
+          "child_final_tokens_nbr": "int",
+          "adult_final_tokens_nbr": "int",
+
+          "lexical_unigrams_nbr": "int",
+          "lexical_bigrams_nbr": "int",
+          "lexical_trigrams_nbr": "int",
+          "syntax_unigrams_nbr": "int",
+          "syntax_bigrams_nbr": "int",
+          "syntax_trigrams_nbr": "int",
+          "syntax_minus_lexic_unigrams_nbr": "int",
+          "syntax_minus_lexic_bigrams_nbr": "int",
+          "syntax_minus_lexic_trigrams_nbr": "int",
+          **{column: kind for threshold in thresholds
+             for (column, kind) in [("out_of_child_vocab_nbr_"+str(threshold), "int"), ("ooc_vocab_words_"+str(threshold), "str_list")]}}
+
+
+def get_data(row1, row2, utt1, utt2, vocabulary_gloss, precondition, ngram_semantics = "duplicates", rand_ex_max_distance = None, sample = 0):
+
+    """
+        Computes linguistic similarities between the utterances represented by row1 and row2,
+        return these measures and complementary information in a dictionnary.
+        The semantic similarity is left to None, as it is computed for many couples at once
+        by get_cosine_similarities().
 
         :param row1: A row of a pre-processed Dataframe, the row contain all useful
         informations about an utterance
-        :type row1: pandas.Series
+        :type row1: pandas.Series or tuple (see pandas.DataFrame.itertuples())
         :param row2: A row of a pre-processed Dataframe, the row contain all
         useful informations about an utterance
-        :type row2: pandas.Series
-        :param vocabulary_gloss: List of five dictionnaries mapping words to their age
-        of acquisition, according to different thresholds
-        :type vocabulary_gloss: list of dict{str:int}
-        :param model: The spacy model that will be used to create embeddings of utterances,
-        tokenise them and create parts of speech
-        :type model: spacy.lang.en.English (or other languages)
-        :param fw: The list of function words of the specified language, retrieved from Spacy
-        :type fw: set
+        :type row2: pandas.Series or tuple (see pandas.DataFrame.itertuples())
+        :param utt1: The already expanded utterance of row1 (embedding, part of speech,
+        unknown and function words ...)
+        :type utt1: Utterance
+        :param utt2: The already expanded utterance of row2
+        :type utt2: Utterance
+        :param vocabulary_gloss: The ages of acquisition of words, according to different
+        thresholds (see generate_database.get_vocab())
+        :type vocabulary_gloss: dict
         :param precondition: Can have three values: "normal", "rand_in" and "rand_ex",
         define if row1 and row2 are respectively strictly consecutives, or at least in the same transcript,
         or finally chosen at random in the whole CHILDES corpus
         :type precondition: str
+        :param ngram_semantics: How common n-grams are counted, see get_simple_ngrams_nbr()
+        :type ngram_semantics: str
+        :param rand_ex_max_distance: If not None, edit distances of "rand_ex" couples greater than it
+        are not computed exactly, see get_edit_distance()
+        :type rand_ex_max_distance: int
+        :param sample: The number of the random sample row2 was drawn in, 0 for a "normal" couple
+        :type sample: int
 
         :returns: A dictionnary containing all the linguistic similarities measures and relevant
-        informations about the couple of utterance represented by row1 and row2
-        :rtype: None
+        informations about the couple of utterance represented by row1 and row2, one value for each
+        column of get_result_schema()
+        :rtype: dict{str:object}
 
+        .. seealso:: generate_database.expand_utterances()
     """
 
-    # pre-process further the utterances represented by row1 and row2, create embeddings,
-    # parts of speech, search for unknown and function words ...
-    utt1 = Utterance(row1.gloss, row1.speaker_id, row1.type)
-    utt2 = Utterance(row2.gloss, row2.speaker_id, row2.type)
-    utt1.expand(model, fw)
-    utt2.expand(model, fw)
-
     condition = get_condition(row1, row2, precondition)
 
     if row1.speaker_code in settings.child_cond:
@@ -57,30 +143,25 @@ def get_data(row1, row2, vocabulary_gloss, model, fw, precondition):
         child_utt = utt2
         adult_utt = utt1
 
-    [vocabulary_1, vocabulary_3, vocabulary_10, vocabulary_20, vocabulary_50] = vocabulary_gloss
-
-    lexical_unigrams_nbr = get_simple_ngrams_nbr(utt1.tokens_gloss,utt2.tokens_gloss,1)
-    lexical_bigrams_nbr = get_simple_ngrams_nbr(utt1.tokens_gloss,utt2.tokens_gloss,2)
-    lexical_trigrams_nbr = get_simple_ngrams_nbr(utt1.tokens_gloss,utt2.tokens_gloss,3)
-    syntax_unigrams_nbr = get_simple_ngrams_nbr(utt1.pos_gloss,utt2.pos_gloss,1)
-    syntax_bigrams_nbr = get_simple_ngrams_nbr(utt1.pos_gloss,utt2.pos_gloss,2)
-    syntax_trigrams_nbr = get_simple_ngrams_nbr(utt1.pos_gloss,utt2.pos_gloss,3)
+    lexical_unigrams_nbr = get_simple_ngrams_nbr(utt1.get_ngrams("tokens",1),utt2.get_ngrams("tokens",1),ngram_semantics)
+    lexical_bigrams_nbr = get_simple_ngrams_nbr(utt1.get_ngrams("tokens",2),utt2.get_ngrams("tokens",2),ngram_semantics)
+    lexical_trigrams_nbr = get_simple_ngrams_nbr(utt1.get_ngrams("tokens",3),utt2.get_ngrams("tokens",3),ngram_semantics)
+    syntax_unigrams_nbr = get_simple_ngrams_nbr(utt1.get_ngrams("pos",1),utt2.get_ngrams("pos",1),ngram_semantics)
+    syntax_bigrams_nbr = get_simple_ngrams_nbr(utt1.get_ngrams("pos",2),utt2.get_ngrams("pos",2),ngram_semantics)
+    syntax_trigrams_nbr = get_simple_ngrams_nbr(utt1.get_ngrams("pos",3),utt2.get_ngrams("pos",3),ngram_semantics)
+    syntax_minus_lexic_unigrams_nbr = get_syntax_minus_lexical_ngrams_nbr(utt1.tokens_gloss,utt2.tokens_gloss, utt1.pos_gloss,utt2.pos_gloss,1)
     syntax_minus_lexic_bigrams_nbr = get_syntax_minus_lexical_ngrams_nbr(utt1.tokens_gloss,utt2.tokens_gloss, utt1.pos_gloss,utt2.pos_gloss,2)
     syntax_minus_lexic_trigrams_nbr = get_syntax_minus_lexical_ngrams_nbr(utt1.tokens_gloss,utt2.tokens_gloss, utt1.pos_gloss,utt2.pos_gloss,3)
 
-    oov_nbr_1, oov_list_1 = out_of_child_vocab(adult_utt.tokens_gloss, child_row.target_child_age, vocabulary_1)
-    oov_nbr_3, oov_list_3 = out_of_child_vocab(adult_utt.tokens_gloss, child_row.target_child_age, vocabulary_3)
-    oov_nbr_10, oov_list_10 = out_of_child_vocab(adult_utt.tokens_gloss, child_row.target_child_age, vocabulary_10)
-    oov_nbr_20, oov_list_20 = out_of_child_vocab(adult_utt.tokens_gloss, child_row.target_child_age, vocabulary_20)
-    oov_nbr_50, oov_list_50 = out_of_child_vocab(adult_utt.tokens_gloss, child_row.target_child_age, vocabulary_50)
-
-    semantic_similarity = get_cosine_similarity(utt1.embedding_gloss, utt2.embedding_gloss)
+    oov_nbrs, oov_lists = out_of_child_vocab(adult_utt.tokens_gloss, child_row.target_child_age, vocabulary_gloss)
 
-    lev_dist = nltk.edit_distance(utt1.tokens_gloss, utt2.tokens_gloss)
+    max_distance = rand_ex_max_distance if precondition == "rand_ex" else None
+    lev_dist = get_edit_distance(utt1.get_token_ids(token_vocabulary), utt2.get_token_ids(token_vocabulary), max_distance)
 
     res = {
 
           "condition": condition,
+          "sample": sample,
           "child_age": child_row.target_child_age,
           "child_sex": child_row.target_child_sex,
           "child_id": child_row.target_child_id,
@@ -92,14 +173,15 @@ def get_data(row1, row2, vocabulary_gloss, model, fw, precondition):
           "child_corpus_name": child_row.corpus_name,
           "adult_corpus_name": adult_row.corpus_name,
 
-          "semantic_similarity": semantic_similarity,
+          # computed for many couples at once, see get_cosine_similarities()
+          "semantic_similarity": None,
           "editdistance": lev_dist,
 
           "child_utt": child_utt.modified_gloss,
           "adult_utt": adult_utt.modified_gloss,
 
-          "child_tokens": str(list(child_utt.tokens_gloss)),
-          "adult_tokens": str(list(adult_utt.tokens_gloss)),
+          "child_tokens": child_utt.tokens_gloss,
+          "adult_tokens": adult_utt.tokens_gloss,
 
           "child_tokens_nbr": child_utt.length_gloss,
           "adult_tokens_nbr": adult_utt.length_gloss,
@@ -113,20 +195,20 @@ def get_data(row1, row2, vocabulary_gloss, model, fw, precondition):
           "child_pos_nbr": len(child_utt.pos_gloss),
           "adult_pos_nbr": len(adult_utt.pos_gloss),
 
-          "child_unknown_words": str(list(child_utt.gloss_unknowns)),
-          "adult_unknown_words": str(list(adult_utt.gloss_unknowns)),
+          "child_unknown_words": child_utt.gloss_unknowns,
+          "adult_unknown_words": adult_utt.gloss_unknowns,
 
           "child_unknown_words_nbr": child_utt.gloss_unknowns_nbr,
           "adult_unknown_words_nbr": adult_utt.gloss_unknowns_nbr,
 
-          "child_stopwords": str(list(child_utt.gloss_stopw)),
-          "adult_stopwords": str(list(adult_utt.gloss_stopw)),
+          "child_stopwords": child_utt.gloss_stopw,
+          "adult_stopwords": adult_utt.gloss_stopw,
 
           "child_stopwords_nbr": child_utt.gloss_stopw_nbr,
           "adult_stopwords_nbr": adult_utt.gloss_stopw_nbr,
 
-          "child_final_tokens": str(list(child_utt.final_tokens_gloss)),
-          "adult_final_tokens": str(list(adult_utt.final_tokens_gloss)),
+          "child_final_tokens": child_utt.final_tokens_gloss,
+          "adult_final_tokens": adult_utt.final_tokens_gloss,
 
           "child_final_tokens_nbr": child_utt.final_tokens_gloss_nbr,
           "adult_final_tokens_nbr": adult_utt.final_tokens_gloss_nbr,
@@ -137,48 +219,52 @@ def get_data(row1, row2, vocabulary_gloss, model, fw, precondition):
           "syntax_unigrams_nbr": syntax_unigrams_nbr,
           "syntax_bigrams_nbr": syntax_bigrams_nbr,
           "syntax_trigrams_nbr": syntax_trigrams_nbr,
+          "syntax_minus_lexic_unigrams_nbr": syntax_minus_lexic_unigrams_nbr,
           "syntax_minus_lexic_bigrams_nbr": syntax_minus_lexic_bigrams_nbr,
-          "syntax_minus_lexic_trigrams_nbr": syntax_minus_lexic_trigrams_nbr,
-
-          "out_of_child_vocab_nbr_1": oov_nbr_1,
-          "ooc_vocab_words_1": oov_list_1,
-          "out_of_child_vocab_nbr_3": oov_nbr_3,
-          "ooc_vocab_words_3": oov_list_3,
-          "out_of_child_vocab_nbr_10": oov_nbr_10,
-          "ooc_vocab_words_10": oov_list_10,
-          "out_of_child_vocab_nbr_20": oov_nbr_20,
-          "ooc_vocab_words_20": oov_list_20,
-          "out_of_child_vocab_nbr_50": oov_nbr_50,
-          "ooc_vocab_words_50": oov_list_50
+          "syntax_minus_lexic_trigrams_nbr": syntax_minus_lexic_trigrams_nbr
 
           }
 
-    return res
-
+    for (threshold, oov_nbr, oov_list) in zip(vocabulary_gloss["thresholds"], oov_nbrs, oov_lists):
+        res["out_of_child_vocab_nbr_"+str(threshold)] = oov_nbr
+        res["ooc_vocab_words_"+str(threshold)] = oov_list
 
-# return the ngrams that are in ngrams1 and at the same time in ngrams2
-# ngrams -> list of tuples
-def intersection(ngrams1, ngrams2):
-    if type(ngrams1) != list:
-        raise TypeError("should be of type list")
-    if type(ngrams2) != list:
-        raise TypeError("should be of type list")
-    return [value for value in ngrams1 if value in ngrams2]
+    return res
 
 
-# return the number of ngrams that are at the same time in str_list_1 and in str_list_2
-# n defines the n in ngram
-def get_simple_ngrams_nbr(str_list_1, str_list_2, n):
-    # ngrams return a generator, hence the cast
-    ngrams1 = list(nltk.ngrams(str_list_1, n))
-    ngrams2 = list(nltk.ngrams(str_list_2, n))
-    return len(intersection(ngrams1, ngrams2))
+def get_simple_ngrams_nbr(ngrams1, ngrams2, semantics = "duplicates"):
+    """
+        Count the n-grams that are at the same time in the first and in the second utterance
+
+        :param ngrams1: The n-grams of the first utterance, see Utterance.get_ngrams()
+        :type ngrams1: collections.Counter{tuple(str):int}
+        :param ngrams2: The n-grams of the second utterance
+        :type ngrams2: collections.Counter{tuple(str):int}
+        :param semantics: "duplicates" to count every occurence in the first utterance of an n-gram
+        that is also in the second one, whatever its number of occurences in the second one,
+        "multiset" to count each common n-gram as many times as it is in both utterances (the minimum
+        of its numbers of occurences). For example, with ("a",) twice in the first utterance and
+        once in the second one, "duplicates" gives 2 and "multiset" gives 1
+        :type semantics: str
+
+        :returns: The number of n-grams that are at the same time in both utterances
+        :rtype: int
+    """
+    if semantics == "duplicates":
+        return sum(count for (ngram, count) in ngrams1.items() if ngram in ngrams2)
+    elif semantics == "multiset":
+        return sum((ngrams1 & ngrams2).values())
+    else:
+        raise ValueError("Unknown n-grams semantics: "+str(semantics))
 
 
 def get_syntax_minus_lexical_ngrams_nbr(words_list_1, words_list_2, pos_1, pos_2, n):
     """
         Search for grammatical ngrams that are not lexical ngrams, in other words,
         gramatically identical series of words that are not lexically the same.
+        Each couple made of an ngram of the first utterance and an ngram of the second utterance
+        having the same parts of speech but different words is counted.
+        With n = 1, it is the number of couples of words of the same grammatical function.
 
         :param words_list_1: the list of words contained in the first utterance
         :type words_list_1: str list
@@ -191,59 +277,125 @@ def get_syntax_minus_lexical_ngrams_nbr(words_list_1, words_list_2, pos_1, pos_2
         :param n: n defines the n in ngram
         :type n: int
 
-        :returns: The number of grammatical ngrams that are not lexical ngrams
+        :returns: The number of grammatical ngrams that are not lexical ngrams, None if the
+        parts of speech are not aligned with the words
         :rtype: int
     """
     # intuitively, part of speech should be aligned and hence of same length than the tokenised sentence
     if len(words_list_1) != len(pos_1) or len(words_list_2) != len(pos_2):
-        return "ERROR"
+        return None
 
-    res = 0
+    # the ngrams of the second utterance, grouped by parts of speech, then by words
+    pos_ngrams_2 = {}
+    for i in range(len(pos_2)-n+1):
+        pos_ngram = tuple(str(pos) for pos in pos_2[i:i+n])
+        pos_ngrams_2.setdefault(pos_ngram, Counter())[tuple(words_list_2[i:i+n])] += 1
+    pos_ngrams_2_nbr = {pos_ngram: sum(words_ngrams.values()) for (pos_ngram, words_ngrams) in pos_ngrams_2.items()}
 
-    for i in range(len(words_list_1)):
-        for j in range(len(words_list_2)):
-            if words_list_1[i] != words_list_2[j] and pos_1[i] == pos_2[j]:
-                 res += 1
+    res = 0
+    for i in range(len(pos_1)-n+1):
+        pos_ngram = tuple(str(pos) for pos in pos_1[i:i+n])
+        if pos_ngram in pos_ngrams_2:
+            # all the ngrams of the second utterance with the same parts of speech, minus those with the same words
+            res += pos_ngrams_2_nbr[pos_ngram] - pos_ngrams_2[pos_ngram][tuple(words_list_1[i:i+n])]
     return res
 
 
-def get_cosine_similarity(feature_vec_1, feature_vec_2):
+def get_edit_distance(ids_1, ids_2, max_distance = None):
+    """
+        Compute the Levenshtein distance between two utterances, at the level of the tokens
+
+        :param ids_1: The tokens of the first utterance, replaced by integer ids
+        :type ids_1: list[int]
+        :param ids_2: The tokens of the second utterance, replaced by integer ids
+        :type ids_2: list[int]
+        :param max_distance: If not None, distances greater than max_distance are not computed,
+        and max_distance + 1 is returned instead
+        :type max_distance: int
+
+        :returns: The number of deletions, insertions, or substitutions of tokens required to
+        transform the first utterance into the second one
+        :rtype: int
+    """
+    if max_distance is not None:
+        # the distance is at least the difference of lengths
+        if abs(len(ids_1) - len(ids_2)) > max_distance:
+            return max_distance + 1
+        # editdistance.eval_criterion() wrongly rejects identical sequences with a null threshold
+        if max_distance == 0:
+            return 0 if ids_1 == ids_2 else 1
+        if not editdistance.eval_criterion(ids_1, ids_2, max_distance):
+            return max_distance + 1
+
+    return editdistance.eval(ids_1, ids_2)
+
+
+def get_normalized_embeddings(embeddings):
+    """
+        :param embeddings: The 300 dimension embeddings representing utterances
+        :type embeddings: list[numpy.ndarray([float]*300)]
+
+        :returns: A matrix whose rows are the embeddings divided by their norm, embeddings
+        made only of zeros (utterances with only function words and unknown words) are kept as is
+        :rtype: numpy.ndarray([[float32]*300])
     """
-        :param feature_vec_1: A 300 dimension embedding, representing the first utterance
-        :type feature_vec_1: numpy.ndarray([float]*300)
-        :param feature_vec_2: A 300 dimension embedding, representing the second utterance
-        :type feature_vec_2: numpy.ndarray([float]*300)
+    if len(embeddings) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    matrix = np.array(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+    return matrix
 
-        :returns: The cosine similarity between both vectors in parameters, value between 0 and 1
-        :rtype: float
+
+def get_cosine_similarities(embeddings, firsts, seconds):
+    """
+        Compute at once the cosine similarities of many couples of utterances
+
+        :param embeddings: The normalized embeddings of the utterances, see get_normalized_embeddings()
+        :type embeddings: numpy.ndarray([[float32]*300])
+        :param firsts: The rows of embeddings of the first utterance of each couple
+        :type firsts: list[int]
+        :param seconds: The rows of embeddings of the second utterance of each couple
+        :type seconds: list[int]
+
+        :returns: The cosine similarity of each couple, value between 0 and 1, 0 if the embedding of
+        one of the utterances is only made of zeros
+        :rtype: numpy.ndarray([float32])
     """
-    return cosine_similarity(feature_vec_1.reshape(1, -1), feature_vec_2.reshape(1, -1))[0][0]
+    return np.einsum("ij,ij->i", embeddings[firsts], embeddings[seconds])
 
 
 def out_of_child_vocab(words, age, vocabulary):
     """
         Search for words that are considered not to be known by a children of a
-        specified age, in a given sentence
+        specified age, in a given sentence, for every threshold of the age of acquisition at once
 
         :param words: the words prononced in a sentence
         :type words: str list
         :param age: the age of a child
         :type age: int
-        :param vocabulary: The dictionnary encoding the age of acquisition of words according to the data of CHILDES
-        :type vocabulary: dict{str:int}
+        :param vocabulary: The ages of acquisition of words according to the data of CHILDES, for several thresholds
+        (see generate_database.get_vocab())
+        :type vocabulary: dict{"thresholds":int list, "ages":dict{str:numpy.ndarray([int16])}}
 
-        :returns: The number of still unknown words in the sentence in parameter, and the list of these unknown words
-        :rtype: int, list[str]
+        :returns: For each threshold, the number of still unknown words in the sentence in parameter,
+        and the list of these unknown words
+        :rtype: list[int], list[list[str]]
     """
-    nbr_unknown = 0
-    unknown_words = []
     # words that are prononced less than 10 times in the whole CHILDES database
     # are not present in vocabulary
-    for word in words:
+    known_words = [word for word in words if word in vocabulary["ages"]]
+    if not known_words:
+        return [0] * len(vocabulary["thresholds"]), [[] for threshold in vocabulary["thresholds"]]
+
+    # one row for each word, one column for each threshold, -1 (no age of acquisition) is never above age
+    unknown = np.array([vocabulary["ages"][word] for word in known_words]) > age
 
-        if word in vocabulary and vocabulary[word] > age:
-            unknown_words.append(word)
-            nbr_unknown += 1
+    nbr_unknown = unknown.sum(axis=0).tolist()
+    unknown_words = [[word for (word, is_unknown) in zip(known_words, unknown[:, i]) if is_unknown]
+                     for i in range(len(vocabulary["thresholds"]))]
 
     return nbr_unknown, unknown_words
 
@@ -255,10 +407,10 @@ def get_condition(row1, row2, precondition):
 
         :param row1: A row of a pre-processed Dataframe, the row contain all useful
         informations about an utterance
-        :type row1: pandas.Series
+        :type row1: pandas.Series or tuple (see pandas.DataFrame.itertuples())
         :param row2: A row of a pre-processed Dataframe, the row contain all
         useful informations about an utterance
-        :type row2: pandas.Series
+        :type row2: pandas.Series or tuple (see pandas.DataFrame.itertuples())
         :param precondition: Can have three values: "normal", "rand_in" and "rand_ex",
         define if row1 and row2 are respectively strictly consecutives, or at least in the same transcript,
         or finally chosen at random in the whole CHILDES corpus
@@ -280,7 +432,7 @@ def get_condition(row1, row2, precondition):
 def parent_sex(row):
     """
         :param row1: A Dataframe row containing all useful informations about an utterance
-        :type row1: pandas.Series
+        :type row1: pandas.Series or tuple (see pandas.DataFrame.itertuples())
         :returns: the sex of the parent
         :rtype: str
     """
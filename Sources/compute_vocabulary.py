@@ -1,13 +1,34 @@
 import re
 import os
-import glob
+import json
 import pickle
 import settings
 import pandas as pd
+from storage import find_table, list_tables, iter_table
 
 
 def create_vocabulary(directory, thresholds):
 
+    """
+        Create a CSV file for each threshold in parameters, containing the age
+        of acquisition of words found in the CHILDES corpus, from all the pre-processed files
+        of the directory, regardless of what has already been counted (see update_vocabulary()).
+
+        :param directory: The name of the directory in which all the pre-processed
+        csv are stored
+        :type directory: str
+        :param thresholds: A list of the thresholds percentage after which a word
+        is considered to be known by childrens
+        :type : int list
+
+        :return: Nothing, the results are stored in CSV files
+        :rtype: None
+    """
+    update_vocabulary(directory, thresholds, rebuild = True)
+
+
+def update_vocabulary(directory, thresholds, rebuild = False):
+
     """
         Create a CSV file for each threshold in parameters, containing the age
         of acquisition of words found in the CHILDES corpus.
@@ -17,6 +38,12 @@ def create_vocabulary(directory, thresholds):
         than A have prononced a specific word (W) more than the threshold percentage
         out of all occurences of W in the whole CHILDES corpus.
 
+        The number of occurences of each word at each age is kept in 'vocabulary/occurences.p',
+        and the pre-processed files already counted in 'vocabulary/manifest.json', so that only
+        the files added since the last call are read, before the ages of acquisition are derived again.
+        If a file already counted has been modified or removed since (its size or modification
+        time differ), all the files are counted again from scratch.
+
         :param directory: The name of the directory in which all the pre-processed
         csv are stored
         :type directory: str
@@ -25,75 +52,192 @@ def create_vocabulary(directory, thresholds):
         the number of time a word has been uttered by younger children in the whole
         CHILDES corpus, divided by the total number of time children (younger and older) have prononced it
         :type : int list
+        :param rebuild: Whether to count all the files again, ignoring the saved occurences
+        :type rebuild: bool
 
         :return: Nothing, the results are stored in CSV files
         :rtype: None
 
-        .. seealso:: generate_database.create_database()
+        .. seealso:: generate_database.process_similarities()
     """
-    # to count number of occurences of words at each age
-    occurences_per_age = {}
-    # to count number of occurences of words with no consideration for the child age
-    total = {}
-    # will store all words that are found in the corpus
-    words = []
-    # will store all ages that are found in the corpus
-    ages = []
+    vocabulary_directory = "../Databases/"+directory+"/vocabulary/"
+    if not os.path.isdir(vocabulary_directory):
+        os.mkdir(vocabulary_directory)
 
-    extension = 'csv'
-    all_filenames = [i for i in glob.glob('../Databases/'+directory+'/modified/*.{}'.format(extension))]
+    all_filenames = [find_table(path) for path in list_tables('../Databases/'+directory+'/modified')]
+    files = {os.path.basename(filename): get_file_signature(filename) for filename in all_filenames}
 
-    # each file correspond to a specific age and language of the CHILDES corpus
-    for filename in all_filenames:
-        print("Currently processing vocabulary using '"+filename+"' file data")
-        df = pd.read_csv(filename)
+    (counted_files, occurences_per_age) = ({}, get_occurences_per_age([])) if rebuild else load_occurences(directory)
 
-        # each row is an utterance
-        for (i, row) in df.iterrows():
+    if any(files.get(name) != signature for (name, signature) in counted_files.items()):
+        print("Some files already counted in the vocabulary have changed, counting all the files again")
+        (counted_files, occurences_per_age) = ({}, get_occurences_per_age([]))
 
-            if row.target_child_age not in ages:
-                ages.append(row.target_child_age)
+    new_filenames = [filename for filename in all_filenames if os.path.basename(filename) not in counted_files]
+    missing_thresholds = any(not os.path.isfile(vocabulary_directory+str(threshold)+".p") for threshold in thresholds)
+    if not new_filenames and not missing_thresholds and not rebuild:
+        print("The vocabulary is up to date")
+        return
 
-            # if the utterance has been prononced by a child
-            if row.speaker_code in settings.child_cond:
+    # number of occurences of each word at each age, for the files already counted, then for each new file
+    occurences = [occurences_per_age.stack()] if not occurences_per_age.empty else []
 
-                tmp = str(row.gloss).split(" ")
-                for word in tmp:
-                    if word in occurences_per_age:
-                        if row.target_child_age in occurences_per_age[word]:
-                            occurences_per_age[word][row.target_child_age] += 1
-                            total[word] += 1
+    # each file correspond to a specific age and language of the CHILDES corpus
+    for filename in new_filenames:
+        print("Currently processing vocabulary using '"+filename+"' file data")
+        # only the columns needed to count the words are read, chunk by chunk
+        for df in iter_table(os.path.splitext(filename)[0], ["speaker_code", "gloss", "target_child_age"]):
+            occurences.append(count_words(df))
+        counted_files[os.path.basename(filename)] = files[os.path.basename(filename)]
 
-                        else:
-                            occurences_per_age[word][row.target_child_age] = 1
-                            total[word] += 1
-                    else:
-                        occurences_per_age[word] = {}
-                        occurences_per_age[word][row.target_child_age] = 1
-                        total[word] = 1
-                        words.append(word)
+    # one row for each word, in order of first appearance, and one column for each age, in ascending order
+    occurences_per_age = get_occurences_per_age(occurences)
+    save_occurences(directory, counted_files, occurences_per_age)
 
     # now that the number of occurence of each words at each age is known,
     # the age at which a word has been prononced more than a threshold, aka
     # age of acquisition, can be processed
-    if not os.path.isdir("../Databases/"+directory+"/vocabulary"):
-        os.mkdir("../Databases/"+directory+"/vocabulary")
-    for threshold in thresholds:
-        res = {}
-        for word in occurences_per_age:
-            sub_total = 0
-            total = 0
-            for age in sorted(list(occurences_per_age[word].keys())):
-                total += occurences_per_age[word][age]
-
-            for age in sorted(list(occurences_per_age[word].keys())):
-                sub_total += occurences_per_age[word][age]
-
-                if ((sub_total/total)*100) > threshold and total > 10:
-                    # the age of acquisition has been found, stop the search
-                    res[word] = age
-                    break
-
-        pickle.dump(res, open("../Databases/"+directory+"/vocabulary/"+str(threshold)+".p", "wb" ) )
+    for (threshold, res) in get_ages_of_acquisition(occurences_per_age, thresholds).items():
+        pickle.dump(res, open(vocabulary_directory+str(threshold)+".p", "wb" ) )
         res = pd.DataFrame({"word":list(res.keys()), "age_of_acquisition":list(res.values())})
-        res.to_csv("../Databases/"+directory+"/vocabulary/"+str(threshold)+'.csv')
+        res.to_csv(vocabulary_directory+str(threshold)+'.csv')
+
+
+def get_file_signature(filename):
+
+    """
+        :param filename: The path of a pre-processed file
+        :type filename: str
+
+        :return: The size and the modification time of the file, used to know if it changed since it has been counted
+        :rtype: dict{str:int}
+    """
+    stat = os.stat(filename)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def load_occurences(directory):
+
+    """
+        :param directory: The name of the directory in which the vocabulary is stored
+        :type directory: str
+
+        :return: The files already counted and the number of occurences of each word (row) at each age (column)
+        (see update_vocabulary()), nothing is returned as counted if the two don't match
+        :rtype: tuple(dict{str:dict}, pandas.DataFrame)
+    """
+    manifest_path = "../Databases/"+directory+"/vocabulary/manifest.json"
+    occurences_path = "../Databases/"+directory+"/vocabulary/occurences.p"
+    if not os.path.isfile(manifest_path) or not os.path.isfile(occurences_path):
+        return {}, get_occurences_per_age([])
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    occurences_per_age = pd.read_pickle(occurences_path)
+
+    # the occurences are saved before the manifest, a run interrupted in between leaves them out of step
+    if int(occurences_per_age.to_numpy().sum()) != manifest["total"]:
+        print("The saved vocabulary occurences don't match their manifest, counting all the files again")
+        return {}, get_occurences_per_age([])
+
+    return manifest["files"], occurences_per_age
+
+
+def save_occurences(directory, counted_files, occurences_per_age):
+
+    """
+        Save the number of occurences of each word at each age, and the manifest of the files they have been counted from
+
+        :param directory: The name of the directory in which the vocabulary is stored
+        :type directory: str
+        :param counted_files: The size and modification time of each file counted, indexed by file name
+        :type counted_files: dict{str:dict}
+        :param occurences_per_age: The number of occurences of each word (row) at each age (column)
+        :type occurences_per_age: pandas.DataFrame
+
+        :return: Nothing
+        :rtype: None
+    """
+    vocabulary_directory = "../Databases/"+directory+"/vocabulary/"
+
+    # written under a temporary name first, so that an interrupted run never leaves a truncated file
+    occurences_per_age.to_pickle(vocabulary_directory+"occurences_processing.p")
+    os.replace(vocabulary_directory+"occurences_processing.p", vocabulary_directory+"occurences.p")
+
+    with open(vocabulary_directory+"manifest_processing.json", "w") as f:
+        json.dump({"files": counted_files, "total": int(occurences_per_age.to_numpy().sum())}, f, indent=4)
+    os.replace(vocabulary_directory+"manifest_processing.json", vocabulary_directory+"manifest.json")
+
+
+def count_words(df):
+
+    """
+        Count the number of occurences of each word prononced by children, at each age
+
+        :param df: pre-processed utterances
+        :type df: pandas.DataFrame
+
+        :return: The number of occurences, indexed by word and age, words in order of first appearance
+        :rtype: pandas.Series
+    """
+    # only the utterances prononced by a child are considered
+    children = df[df["speaker_code"].isin(settings.child_cond)]
+    words = pd.DataFrame({"word": children["gloss"].astype(str).str.split(" "), "age": children["target_child_age"]})
+
+    return words.explode("word").groupby(["word", "age"], sort=False).size()
+
+
+def get_occurences_per_age(occurences):
+
+    """
+        :param occurences: The number of occurences of words at each age (see count_words()), of several files
+        :type occurences: list[pandas.Series]
+
+        :return: The total number of occurences of each word (row) at each age (column),
+        words in order of first appearance and ages in ascending order
+        :rtype: pandas.DataFrame
+    """
+    if not occurences:
+        return pd.DataFrame(dtype=int)
+
+    occurences = pd.concat(occurences).groupby(level=["word", "age"], sort=False).sum()
+    words = occurences.index.get_level_values("word").unique()
+
+    return occurences.unstack("age", fill_value=0).reindex(words).sort_index(axis=1)
+
+
+def get_ages_of_acquisition(occurences_per_age, thresholds):
+
+    """
+        Compute the age of acquisition of words, for every threshold at once, from the
+        cumulative number of occurences of each word over the ages.
+        Only the words prononced more than 10 times have an age of acquisition.
+
+        :param occurences_per_age: The number of occurences of each word (row) at each age (column),
+        ages in ascending order (see get_occurences_per_age())
+        :type occurences_per_age: pandas.DataFrame
+        :param thresholds: The thresholds percentage after which a word is considered to be known by childrens
+        :type thresholds: int list
+
+        :return: For each threshold, the age of acquisition of each word
+        :rtype: dict{int:dict{str:int}}
+    """
+    if occurences_per_age.empty:
+        return {threshold: {} for threshold in thresholds}
+
+    words = occurences_per_age.index.to_numpy()
+    ages = occurences_per_age.columns.to_numpy()
+
+    sub_totals = occurences_per_age.to_numpy().cumsum(axis=1)
+    totals = sub_totals[:, -1:]
+
+    res = {}
+    for threshold in thresholds:
+        # for each word, the first age at which the threshold is passed
+        passed = ((sub_totals/totals)*100) > threshold
+        found = passed.any(axis=1) & (totals[:, 0] > 10)
+        first_ages = ages[passed.argmax(axis=1)[found]]
+
+        res[threshold] = dict(zip(words[found].tolist(), first_ages.tolist()))
+
+    return res
@@ -0,0 +1,104 @@
+import os
+import json
+import numpy as np
+
+
+# the embeddings and the mask are only read and written with numpy, analysis notebooks don't need spacy
+
+def get_embedding_store_path(directory, age):
+
+    """
+        :param directory: The name of the database directory
+        :type directory: str
+        :param age: The target child age
+        :type age: int
+
+        :returns: The path of the embedding store of the age, without extension
+        :rtype: str
+    """
+    return "../Databases/"+directory+"/embeddings/"+str(age)
+
+
+def create_embedding_store(path, rows, settings):
+
+    """
+        Create the files of the embedding store of an age, if they don't exist or were made with other settings:
+        '<age>.npy' the float32 embedding of each utterance, the row being its "Indice",
+        '<age>_filled.npy' a mask of the rows already written (utterances that are never part
+        of a couple are not parsed), and '<age>.json' the manifest recording the settings.
+        The manifest is written last, so that an interrupted creation is done again.
+
+        :param path: The path of the store, without extension, see get_embedding_store_path()
+        :type path: str
+        :param rows: The number of rows, the greatest "Indice" of the age plus one
+        :type rows: int
+        :param settings: What the embeddings depend on: model, stop-words, embedding mode ...
+        and their dimension in "dim", see generate_database.get_embedding_settings()
+        :type settings: dict
+
+        :returns: True if the store has been created, False if it already existed
+        :rtype: bool
+    """
+    if os.path.isfile(path+".json"):
+        with open(path+".json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["rows"] == rows and manifest["settings"] == settings:
+            return False
+
+    # the files are sparse, their disk space is only used once rows are written
+    embeddings = np.lib.format.open_memmap(path+"_processing.npy", mode="w+", dtype=np.float32, shape=(rows, settings["dim"]))
+    del embeddings
+    os.replace(path+"_processing.npy", path+".npy")
+    filled = np.lib.format.open_memmap(path+"_filled_processing.npy", mode="w+", dtype=np.bool_, shape=(rows,))
+    del filled
+    os.replace(path+"_filled_processing.npy", path+"_filled.npy")
+
+    with open(path+"_processing.json", 'w', encoding="utf-8") as f:
+        json.dump({"rows": rows, "settings": settings}, f, indent=1)
+    os.replace(path+"_processing.json", path+".json")
+    return True
+
+
+def write_embeddings(path, indices, embeddings):
+
+    """
+        Write embeddings in the store of an age, in place, so that the shards of an age can
+        write in the same store at the same time. An utterance written by two shards has the same embedding in both.
+
+        :param path: The path of the store, without extension, see get_embedding_store_path()
+        :type path: str
+        :param indices: The "Indice" of the utterances
+        :type indices: list[int]
+        :param embeddings: The embedding of each utterance
+        :type embeddings: numpy.ndarray([[float32]])
+
+        :returns: Nothing
+        :rtype: None
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+
+    store = np.lib.format.open_memmap(path+".npy", mode="r+")
+    store[indices] = embeddings
+    store.flush()
+    del store
+
+    # the rows are only marked as filled once written
+    filled = np.lib.format.open_memmap(path+"_filled.npy", mode="r+")
+    filled[indices] = True
+    filled.flush()
+    del filled
+
+
+def load_embedding_store(path):
+
+    """
+        :param path: The path of the store, without extension, see get_embedding_store_path()
+        :type path: str
+
+        :returns: The embeddings of the utterances, memory-mapped read-only and indexed by "Indice",
+        the mask of the rows filled, and the manifest of the store
+        :rtype: (numpy.memmap([[float32]]), numpy.memmap([bool]), dict)
+    """
+    with open(path+".json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return (np.load(path+".npy", mmap_mode="r"), np.load(path+"_filled.npy", mmap_mode="r"), manifest)
@@ -1,25 +1,50 @@
-from compute_similarity import get_data
-from compute_vocabulary import create_vocabulary
+from utterance import Utterance
+from utterance_cache import AnalysisCache
+from compute_similarity import get_data, get_result_schema, get_normalized_embeddings, get_cosine_similarities
+from compute_vocabulary import update_vocabulary
+from storage import extensions, get_storage, find_table, list_tables, read_table, count_rows, read_rows, get_row_offsets, write_table, ResultSink, concatenate_tables
+from vector_table import VectorTable, get_vector_table_path, export_vector_table
+from embedding_store import get_embedding_store_path, create_embedding_store, write_embeddings
 
 import os
 import re
 import sys
-import csv
+import json
 import time
-import glob
-import admin
-import spacy
+import signal
 import pickle
+import numpy as np
+import hashlib
+import threading
 import pandas as pd
 from os import path
 import subprocess as sub
-from random import randint
-from gensim.models import KeyedVectors
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 import settings
 
 
-def process_similarities(directory, language, age_min, age_max, test = False):
+# number of couples whose semantic similarities are computed at once
+couples_batch_size = 10000
+# the results are written once this number of rows or this time (in seconds) is reached, see storage.ResultSink
+results_flush_rows = 30000
+results_flush_seconds = 60
+
+# columns of the pre-processed utterances needed to compute the similarities of the couples
+pair_columns = ["Indice", "gloss", "speaker_id", "type", "speaker_code", "transcript_id", "utterance_order",
+                "target_child_age", "target_child_sex", "target_child_id", "corpus_name", "num_morphemes"]
+# columns needed to find the couples and their random utterances, see get_age_index()
+index_columns = ["transcript_id", "utterance_order", "speaker_code"]
+
+# the ages are retrieved by several threads, which all record their raw file in the same manifest
+raw_manifest_lock = threading.Lock()
+
+
+# the options of process_similarities(), expand_data(), expand_shard() and expand_utterances() are keyword-only,
+# so that adding one can never shift the others in a call
+def process_similarities(directory, language, age_min, age_max, test = False, *, batch_size = 1000, n_process = 1, workers = 1, seed = None, shards = 1, cache_size = 100000, embedding_mode = "sum", ngram_semantics = "duplicates", rand_ex_max_distance = None,
+                         thresholds = (1, 3, 10, 20, 50), retrieval_workers = 4, storage = "parquet", stream = False, spacy_profile = "accurate",
+                         baseline_samples = 1):
 
     """
         Retrieve raw data from the CHILDES database, pre-process it and compute
@@ -37,9 +62,50 @@ def process_similarities(directory, language, age_min, age_max, test = False):
         :param test: If True, only a small amount of utterances will be selected for each age,
         in order to accelerate processing. It is a development oriented parameter
         :type test: bool
+        :param batch_size: Number of utterances given at once to the spacy model
+        :type batch_size: int
+        :param n_process: Number of processes used by the spacy model to parse utterances
+        :type n_process: int
+        :param workers: Number of ages processed in parallel, each worker process loads its own spacy model
+        :type workers: int
+        :param seed: Seed of the random selection of the "rand_in" and "rand_ex" utterances,
+        with the same seed and number of shards, results are identical whatever the number of workers
+        :type seed: int
+        :param shards: Number of groups of transcripts each age is split into, the shards of an age
+        are processed by different workers, which is useful for the biggest ages
+        :type shards: int
+        :param cache_size: Number of utterance analyses kept in memory by each process, analyses are also
+        persisted in the 'cache' folder of the database and reused in later runs, 0 disables the cache
+        :type cache_size: int
+        :param embedding_mode: How the embeddings of the words of an utterance are combined: "sum", "mean" or "l2",
+        see Utterance.compute_simi()
+        :type embedding_mode: str
+        :param ngram_semantics: How the lexical and syntactic n-grams common to both utterances are counted:
+        "duplicates" or "multiset", see compute_similarity.get_simple_ngrams_nbr()
+        :type ngram_semantics: str
+        :param rand_ex_max_distance: If not None, the edit distances of the "rand_ex" couples greater than it
+        are not computed exactly but reported as rand_ex_max_distance + 1, which is faster
+        :type rand_ex_max_distance: int
+        :param thresholds: The thresholds (in percent) of the ages of acquisition used to find the words of
+        the adults that are out of the child vocabulary, see compute_vocabulary.create_vocabulary()
+        :type thresholds: int list
+        :param retrieval_workers: Number of ages retrieved from CHILDES at the same time
+        :type retrieval_workers: int
+        :param storage: Format of the raw, modified and results tables: "parquet" or "csv",
+        CSV is used if pyarrow is not installed. Tables already written in the other format are still read
+        :type storage: str
+        :param stream: If True, the utterances of an age are read shard by shard instead of all at once,
+        which bounds the memory used by each process, see expand_shard()
+        :type stream: bool
+        :param spacy_profile: "accurate" to parse the utterances with the large spacy models, "fast" with the
+        medium ones, only the components needed are loaded in both cases, see load_model()
+        :type spacy_profile: str
+        :param baseline_samples: Number of "rand_in" and "rand_ex" utterances drawn for each couple,
+        the results having a line for each of them, identified by its "sample" column
+        :type baseline_samples: int
 
         :returns: Nothing, but results like linguistic similarities are saved in
-        several CSV files in the specified directory, one CSV for each target child age
+        several files in the specified directory, one for each target child age
         :rtype: None
 
         .. seealso:: Run.ipynb notebook
@@ -56,37 +122,85 @@ def process_similarities(directory, language, age_min, age_max, test = False):
         print("Expanding the already existing "+directory+" database \n")
 
     # this is necessary as a parameter need to be modified on windows
-    # for processing of japanese and chinese characters
-    if language == "Japanese" or language == "Chinese":
+    # for processing of japanese and chinese characters, admin relies on pywin32
+    # so it is only imported there
+    if (language == "Japanese" or language == "Chinese") and os.name == "nt":
+        import admin
         admin.runAsAdmin()
 
 
     print("\nInitializing settings")
     settings.init()
+    storage = get_storage(storage)
 
     print("\nCreating the initial directories architecture")
     create_architecture(directory)
 
     print("\nRetrieving raw data from CHILDES")
-    retrieve_childes_data(directory, language, age_min, age_max, test)
+    retrieve_childes_data(directory, language, age_min, age_max, test, retrieval_workers, storage)
 
     print("\nCharging the stop-words")
-    fw = settings.dic_SW[language]
+    fw = settings.get_stop_words(language)
+    # recorded with the embeddings of the utterances saved for each age
+    embedding_settings = get_embedding_settings(language, spacy_profile, fw, embedding_mode)
 
-    if not os.path.isdir("../Databases/"+directory+"/vocabulary"):
-        print("\nCreating the vocabulary")
-        create_vocabulary(directory, [1,3,10,20,50])
+    # only the ages retrieved since the vocabulary was last updated are counted
+    print("\nUpdating the vocabulary")
+    update_vocabulary(directory, thresholds)
     print("\nCharging the vocabulary")
-    vocabulary = get_vocab(directory)
-
-    print("\nCharging the spacy model ")
-    nlp = spacy.load(settings.dic_spacy[language])
+    vocabulary = get_vocab(directory, thresholds)
+
+    ages = list(range(age_min, age_max+1))
+
+    if workers > 1:
+        for age in [age for age in ages if find_table("../Databases/"+directory+"/results/"+str(age)) is not None]:
+            print("\n"+str(age)+" month age has already been treated")
+            ages.remove(age)
+        # the biggest ages are treated first, so that they don't end up alone at the end of the run
+        ages.sort(key=lambda age: os.path.getsize(find_table("../Databases/"+directory+"/modified/"+str(age))), reverse=True)
+        # the shards of an age all write in the embedding store of the age, it has to exist before
+        for age in ages:
+            create_age_embedding_store(directory, age, embedding_settings)
+        # the same for the offset index of the CSV tables the streamed shards read their rows from
+        if stream:
+            for age in ages:
+                if find_table("../Databases/"+directory+"/modified/"+str(age)).endswith(extensions["csv"]):
+                    get_row_offsets("../Databases/"+directory+"/modified/"+str(age))
+
+        # exported before the workers start, which all share it
+        print("\nCharging the vectors of the spacy model")
+        vector_table_path = get_vector_table(directory, language, spacy_profile)
+
+        print("\nExpanding each transcripts objects by processing embeddings of each utterances, using "+str(workers)+" workers")
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(directory, language, cache_size, embedding_mode, thresholds, spacy_profile, vector_table_path)) as executor:
+            futures = {executor.submit(expand_shard_in_worker, age, shard, shards, directory, batch_size = batch_size, n_process = n_process, seed = seed,
+                                       ngram_semantics = ngram_semantics, rand_ex_max_distance = rand_ex_max_distance, storage = storage,
+                                       stream = stream, baseline_samples = baseline_samples): age
+                       for age in ages for shard in range(shards)}
+            # number of shards still being processed for each age
+            remaining = {age: shards for age in ages}
+            for future in as_completed(futures):
+                # raise in the main process any exception that happened in a worker
+                future.result()
+                age = futures[future]
+                remaining[age] -= 1
+                if remaining[age] == 0:
+                    merge_shards(directory, age, shards, storage)
+                    print(str(age)+" month age is done")
+    else:
+        print("\nCharging the spacy model ")
+        vector_table = VectorTable(get_vector_table(directory, language, spacy_profile))
+        nlp = load_model(language, spacy_profile, vector_table)
+        cache = AnalysisCache(directory, language, nlp, fw, embedding_mode, cache_size) if cache_size > 0 else None
 
-    print("\nExpanding each transcripts objects by processing embeddings of each utterances")
-    for age in range(age_min, age_max+1):
-        expand_data(age, nlp, fw, directory, vocabulary)
+        print("\nExpanding each transcripts objects by processing embeddings of each utterances")
+        for age in ages:
+            expand_data(age, nlp, fw, directory, vocabulary, batch_size = batch_size, n_process = n_process, seed = seed, shards = shards,
+                        cache = cache, embedding_mode = embedding_mode, ngram_semantics = ngram_semantics, rand_ex_max_distance = rand_ex_max_distance,
+                        storage = storage, stream = stream, vector_table = vector_table, embedding_settings = embedding_settings,
+                        baseline_samples = baseline_samples)
 
-    print("\nDone, all data is accessible in '../Databases/"+directory+"/results.csv'")
+    print("\nDone, all data is accessible in '../Databases/"+directory+"/results'")
 
 
 # Creates the target directory and its subfolders if they don't exist
@@ -122,8 +236,20 @@ def create_architecture(directory):
     else:
         print("'Databases/"+directory+"/results' folder already exist")
 
+    if not os.path.isdir("../Databases/"+directory+"/cache"):
+        os.mkdir("../Databases/"+directory+"/cache")
+        print("Created a 'Databases/"+directory+"/cache' folder")
+    else:
+        print("'Databases/"+directory+"/cache' folder already exist")
 
-def retrieve_childes_data(directory, language, age_min, age_max, test):
+    if not os.path.isdir("../Databases/"+directory+"/embeddings"):
+        os.mkdir("../Databases/"+directory+"/embeddings")
+        print("Created a 'Databases/"+directory+"/embeddings' folder")
+    else:
+        print("'Databases/"+directory+"/embeddings' folder already exist")
+
+
+def retrieve_childes_data(directory, language, age_min, age_max, test, retrieval_workers = 4, storage = "csv"):
 
     """
         Retrieve raw data from the CHILDES database and pre-process it in
@@ -141,8 +267,12 @@ def retrieve_childes_data(directory, language, age_min, age_max, test):
         :param test: If True, only a small amount of utterances will be selected for each age,
         in order to accelerate processing. It is a development oriented parameter
         :type test: bool
+        :param retrieval_workers: Number of ages retrieved at the same time, each one by its own rscript process
+        :type retrieval_workers: int
+        :param storage: Format of the raw and pre-processed tables, see storage.get_storage()
+        :type storage: str
 
-        :returns: Nothing, but pre-processed CSV representing all the utterances
+        :returns: Nothing, but pre-processed tables representing all the utterances
         retrieved from the specified language transcripts of CHILDES are saved
         in the specified directory.
         :rtype: None
@@ -160,35 +290,63 @@ def retrieve_childes_data(directory, language, age_min, age_max, test):
         print("\n'Databases/"+directory+"/original_merged.csv' file already exist")
 
     else:
+        ages = []
         for age in range(age_min, age_max+1):
-            if not os.path.isfile("../Databases/"+directory+"/raw/"+str(age)+".csv"):
-                print("Currently retrieving utterances for the " +str(age) + " month age")
-                charge_age(directory, settings.dic_childes[language], age, 100, 3)
+            raw_filename = find_table("../Databases/"+directory+"/raw/"+str(age))
+            if raw_filename is None:
+                ages.append(age)
+            elif not check_raw_file(directory, os.path.basename(raw_filename)):
+                print("'"+raw_filename+"' file doesn't match its manifest, it will be retrieved again")
+                os.remove(raw_filename)
+                ages.append(age)
             else:
-                print("'Databases/"+directory+"/raw/"+str(age)+".csv' file already exist")
+                print("'"+raw_filename+"' file already exist")
+
+        # the rscript processes mostly wait for the CHILDES server, so a few of them run at the same time
+        failed_ages = []
+        with ThreadPoolExecutor(max_workers=retrieval_workers) as executor:
+            futures = {}
+            for age in ages:
+                futures[executor.submit(charge_age, directory, settings.dic_childes[language], age, 100, 3, storage = storage)] = age
+            for (done, future) in enumerate(as_completed(futures)):
+                age = futures[future]
+                if future.result():
+                    print("Utterances for the "+str(age)+" month age retrieved ("+str(done+1)+"/"+str(len(ages))+")")
+                else:
+                    print("Utterances for the "+str(age)+" month age could not be retrieved ("+str(done+1)+"/"+str(len(ages))+")")
+                    failed_ages.append(age)
+
+        if failed_ages:
+            sys.exit("There has been recurring problems during retrieval of data for children of age: "+", ".join(str(age) for age in sorted(failed_ages))+" months, the program will stop")
 
         # reduce the number of utterances for each age to 1000 to speed up the process
         if test:
-            extension = 'csv'
-            all_filenames = [filename for filename in glob.glob('../Databases/'+directory+'/raw/*.{}'.format(extension))]
-            for filename in all_filenames:
-                df = pd.read_csv(filename, engine="python", encoding='utf-8')
+            for raw_path in list_tables('../Databases/'+directory+'/raw'):
+                filename = find_table(raw_path)
+                df = read_table(raw_path)
                 df = df[0:1000]
-                df.to_csv(filename,index=False, encoding='utf-8')
+                # the table is written in the storage format, the former file is removed if it was in the other one
+                if write_table(df, raw_path, storage) != filename:
+                    os.remove(filename)
+                record_raw_file(directory, os.path.basename(find_table(raw_path)), len(df))
 
-        print("All the raw transcripts were stored by target children's age as CSV files in the 'Databases/"+directory+"/raw' folder")
+        print("All the raw transcripts were stored by target children's age in the 'Databases/"+directory+"/raw' folder")
 
         print("\nPreprocessing all raw files")
 
         for age in range(age_min, age_max+1):
-            raw_filename = "../Databases/"+directory+"/raw/"+str(age)+".csv"
-            modified_filename = "../Databases/"+directory+"/modified/"+str(age)+".csv"
-            if os.path.isfile(modified_filename):
-                print(modified_filename+" file already exist")
+            raw_filename = find_table("../Databases/"+directory+"/raw/"+str(age))
+            modified_path = "../Databases/"+directory+"/modified/"+str(age)
+            if find_table(modified_path) is not None:
+                print(find_table(modified_path)+" file already exist")
             else:
-                print("Creating the '"+modified_filename+"' file")
+                print("Creating the '"+modified_path+"' table")
 
-                df = pd.read_csv(raw_filename, engine="python", encoding='utf-8')
+                # a raw file that doesn't match its manifest has been modified or truncated since its retrieval
+                if not check_raw_file(directory, os.path.basename(raw_filename)):
+                    sys.exit("'"+raw_filename+"' file doesn't match its manifest, remove it and run again to retrieve it")
+
+                df = read_table(os.path.splitext(raw_filename)[0])
                 df["target_child_age"] = df["target_child_age"].astype(int)
                 del df["Unnamed: 0"]
                 df = df.sort_values(["target_child_age", "transcript_id", "utterance_order"], ascending=[True, True, True])
@@ -198,15 +356,16 @@ def retrieve_childes_data(directory, language, age_min, age_max, test):
                 df["Indice"] = df.index
                 df = df[df['gloss'].notna()]
 
-                df.to_csv("../Databases/"+directory+"/modified/"+str(age)+".csv", index=False, encoding='utf-8')
+                write_table(df, modified_path, storage)
 
 
-def charge_age(directory, language, age, delay = 100, trial_nbr = 5, failure_nbr = 0):
+def charge_age(directory, language, age, delay = 100, trial_nbr = 5, backoff = 5, storage = "csv"):
 
     """
-        Recursive function that retrieve all english utterances of a certain age (in month)
-        from the CHILDES corpus by calling an rscript, and store these utterances and their
-        related informations unordered in a CSV file
+        Retrieve all the utterances of a certain age (in month) from the CHILDES corpus
+        by calling an rscript, and store these utterances and their related informations
+        unordered in a table. The table appears only once complete, and is recorded
+        in the manifest of the raw folder (see record_raw_file())
 
         :param directory: The name of the directory in which the CSV file containing
         raw unordered data retrieved from CHILDES will be stored
@@ -220,65 +379,370 @@ def charge_age(directory, language, age, delay = 100, trial_nbr = 5, failure_nbr
         will be retrieved
         :type age: int
 
-        :param delay: Time to wait before considering the trial to retrieve data has been
-        unsuccessful
+        :param delay: Time to wait for the rscript to end before considering the trial
+        to retrieve data has been unsuccessful
         :type delay: int
 
-        :param trial_nbr: Number of trial that are left to retrieve the data, a trial
-        is considered failed when the delay has been passed
+        :param trial_nbr: Number of trials left after the first one, a trial
+        is considered failed when the rscript fails or the delay has been passed
         :type trial_nbr: int
 
-        :param failure_nbr: Number of trial that has been failed until now
-        :type failure_nbr: int
+        :param backoff: Time to wait before the first new trial, doubled after each failure
+        :type backoff: int
 
-        :returns: Nothing
-        :rtype: None
+        :param storage: Format of the table, the CSV file written by the rscript is converted
+        if needed (see storage.get_storage())
+        :type storage: str
 
-        .. seealso:: create_database() function
-        .. warning:: The rscript that the charge_age function calls can fail
-        trying to retrieve a specific age transcript's utterances for several
-        times, mainly in case of failed connection from either CHILDES server or
-        the user computer, if after several unsuccessful attempts to retrieve
-        the data the calls keel failing, the program will stop.
-        .. note:: Nothing
-        .. todo:: Nothing
-    """
-    # command that will activate the rscript
-    cmd_line = [r"C:\Program Files\R\R-3.6.1\bin\Rscript", "script_get_raw_trscrpt.R", language, str(age), "../Databases/"+directory+"/raw/"]
-    sub.Popen(cmd_line)
-
-    # creation of the timer to measure the delay
-    now = time.time()
-    future  = now + delay
-    # while the delay hasn't been passed and the CSV file creation is not done
-    while time.time() < future and not os.path.isfile("../Databases/"+directory+"/raw/"+str(age)+".csv"):
-        # delay to allow the OS to save the CSV file before letting the program
-        # search for it
-        time.sleep(0.4)
-    # if the delay has passed without creation of CSV file
-    if not os.path.isfile("../Databases/"+directory+"/raw/"+str(age)+".csv"):
-        # if there is still trials left
-        if trial_nbr > 0:
+        :returns: True if the data has been retrieved, False if all the trials failed
+        :rtype: bool
+
+        .. seealso:: retrieve_childes_data() function
+        .. warning:: The rscript can fail trying to retrieve a specific age transcript's
+        utterances for several times, mainly in case of failed connection from either
+        CHILDES server or the user computer.
+    """
+    raw_path = "../Databases/"+directory+"/raw/"+str(age)
+
+    for failure_nbr in range(trial_nbr+1):
+        if failure_nbr > 0:
+            time.sleep(backoff * 2**(failure_nbr-1))
+
+        # the rscript writes in a temporary file, renamed once complete, so that a half-written file is never mistaken for the raw file,
+        # each trial has its own, so that a process of a previous trial can never write in the file of the next one
+        processing_filename = raw_path+"_trial"+str(failure_nbr)+"_processing.csv"
+        # command that will activate the rscript
+        cmd_line = [settings.rscript, "script_get_raw_trscrpt.R", language, str(age), "../Databases/"+directory+"/raw/", processing_filename]
+
+        print("Currently retrieving utterances for the " +str(age) + " month age")
+        # in its own process group, so that the processes it starts (Rterm on Windows) can be killed with it
+        if os.name == "nt":
+            process = sub.Popen(cmd_line, creationflags=sub.CREATE_NEW_PROCESS_GROUP)
+        else:
+            process = sub.Popen(cmd_line, start_new_session=True)
+        try:
+            process.wait(timeout=delay)
+        except sub.TimeoutExpired:
+            # otherwise the process would still be writing while the next trial starts
+            kill_process_tree(process)
             print("The delay of retrieval for children of age: "+str(age)+" months has passed "+str(failure_nbr+1)+ " times")
-            charge_age(directory, language, age, delay, trial_nbr-1, failure_nbr + 1)
         else:
-            sys.exit("There has been recurring problems during retrieval of data for children of age: "+str(age)+" months, the program will stop")
+            if process.returncode == 0 and os.path.isfile(processing_filename):
+                try:
+                    df = pd.read_csv(processing_filename, encoding='utf-8', low_memory=False)
+                except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError):
+                    df = None
+                if df is not None:
+                    if storage == "csv":
+                        os.replace(processing_filename, raw_path+".csv")
+                        raw_filename = raw_path+".csv"
+                    else:
+                        raw_filename = write_table(df, raw_path, storage)
+                        os.remove(processing_filename)
+                    record_raw_file(directory, os.path.basename(raw_filename), len(df))
+                    return True
+            print("The retrieval for children of age: "+str(age)+" months has failed "+str(failure_nbr+1)+ " times")
+
+        if os.path.isfile(processing_filename):
+            os.remove(processing_filename)
+
+    return False
+
+
+def kill_process_tree(process):
+
+    """
+        Kill a process started in its own process group by charge_age(), with all the processes it started
+
+        :param process: The process
+        :type process: subprocess.Popen
+
+        :returns: Nothing, once the process has ended
+        :rtype: None
+    """
+    if os.name == "nt":
+        sub.run(["taskkill", "/T", "/F", "/PID", str(process.pid)], stdout=sub.DEVNULL, stderr=sub.DEVNULL)
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    # in case taskkill failed
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+
+
+def get_file_sha256(filename):
+
+    """
+        :param filename: The path of a file
+        :type filename: str
+
+        :returns: The sha256 checksum of the content of the file
+        :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def record_raw_file(directory, name, rows):
+
+    """
+        Record the number of rows and the checksum of a raw file in 'raw/manifest.json',
+        so that the file can be checked before being read (see check_raw_file())
+
+        :param directory: The name of the directory in which the raw files are stored
+        :type directory: str
+        :param name: The name of the raw file, in the raw folder
+        :type name: str
+        :param rows: The number of utterances in the raw file
+        :type rows: int
+
+        :returns: Nothing
+        :rtype: None
+    """
+    manifest_filename = "../Databases/"+directory+"/raw/manifest.json"
+    sha256 = get_file_sha256("../Databases/"+directory+"/raw/"+name)
+
+    with raw_manifest_lock:
+        manifest = {}
+        if os.path.isfile(manifest_filename):
+            with open(manifest_filename) as f:
+                manifest = json.load(f)
+        manifest[name] = {"rows": rows, "sha256": sha256}
+
+        with open("../Databases/"+directory+"/raw/manifest_processing.json", "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace("../Databases/"+directory+"/raw/manifest_processing.json", manifest_filename)
+
+
+def check_raw_file(directory, name):
+
+    """
+        :param directory: The name of the directory in which the raw files are stored
+        :type directory: str
+        :param name: The name of the raw file, in the raw folder
+        :type name: str
+
+        :returns: False if the checksum or the number of rows of the raw file differ from the ones recorded
+        in its manifest (see record_raw_file()), True otherwise. Files retrieved before manifests existed are recorded as they are
+        :rtype: bool
+    """
+    manifest_filename = "../Databases/"+directory+"/raw/manifest.json"
+    manifest = {}
+    if os.path.isfile(manifest_filename):
+        with open(manifest_filename) as f:
+            manifest = json.load(f)
+
+    if name not in manifest:
+        print("'Databases/"+directory+"/raw/"+name+"' file has no manifest, it is recorded as it is")
+        rows = len(read_table("../Databases/"+directory+"/raw/"+os.path.splitext(name)[0]))
+        record_raw_file(directory, name, rows)
+        return True
+
+    if get_file_sha256("../Databases/"+directory+"/raw/"+name) != manifest[name]["sha256"]:
+        return False
+    return count_rows("../Databases/"+directory+"/raw/"+os.path.splitext(name)[0]) == manifest[name]["rows"]
+
+
+def get_vocab(directory, thresholds = (1, 3, 10, 20, 50)):
+
+    """
+        Charge the age of acquisition dictionnaries of children, considering different
+        thresholds, and merge them in a single dictionnary
+
+        :param directory: The name of the directory in which the vocabulary is stored
+        :type directory: str
+        :param thresholds: The thresholds of the age of acquisition dictionnaries to charge
+        (see compute_vocabulary.create_vocabulary())
+        :type thresholds: int list
+
+        :returns: The thresholds, and for each word the array of its age of acquisition for each threshold,
+        -1 if the word has no age of acquisition for a threshold
+        :rtype: dict{"thresholds":int list, "ages":dict{str:numpy.ndarray([int16])}}
+    """
+    ages = {}
+    for (i, threshold) in enumerate(thresholds):
+        vocabulary = pickle.load( open("../Databases/"+directory+"/vocabulary/"+str(threshold)+".p", "rb" ) )
+        for (word, age) in vocabulary.items():
+            if word not in ages:
+                ages[word] = np.full(len(thresholds), -1, dtype=np.int16)
+            ages[word][i] = age
+
+    return {"thresholds": list(thresholds), "ages": ages}
+
+
+def load_model(language, profile = "accurate", vector_table = None):
+
+    """
+        Load the spacy model of a language with only the components needed by Utterance.expand():
+        the tokenizer, the tagger or morphologizer giving the parts of speech, and the vectors.
+        The other components (parser, named entities, lemmatizer ...) would run for nothing.
+        If a table of the vectors of the model is given, the vectors of the model are not charged,
+        they are read from the table instead.
+
+        :param language: The language of the utterances
+        :type language: str
+        :param profile: "accurate" for the large models, "fast" for the medium ones, smaller and faster
+        but with less precise vectors and parts of speech
+        :type profile: str
+        :param vector_table: The vectors of the model, see get_vector_table()
+        :type vector_table: vector_table.VectorTable
+
+        :returns: The spacy model
+        :rtype: spacy.lang.en.English (or other languages)
+    """
+    # spacy is only imported once the stage that needs it runs, it takes seconds
+    import spacy
+
+    if profile not in settings.dic_spacy_profiles:
+        raise ValueError("Unknown spacy profile: "+str(profile)+", should be either: "+", ".join(settings.dic_spacy_profiles))
+    name = settings.dic_spacy_profiles[profile][language]
+
+    # the components are those of the model, which depend on the language and version
+    # "components" also lists the disabled components (e.g. senter), which "pipeline" doesn't, they would still be built
+    meta = spacy.util.get_model_meta(spacy.util.get_package_path(name))
+    excluded = [component for component in meta.get("components", meta["pipeline"]) if component not in settings.spacy_components]
+
+    if vector_table is None:
+        model = spacy.load(name, exclude=excluded)
+    else:
+        model = spacy.load(name, exclude=excluded+["vectors"])
+        vector_table.attach(model)
+    print("Charged the spacy model "+name+" ("+profile+" profile) with the components: "+", ".join(model.pipe_names))
+    return model
+
+
+def get_vector_table(directory, language, profile = "accurate"):
+
+    """
+        Export the vectors of the spacy model of a language in the cache folder, if it hasn't been done yet
+
+        :param directory: The name of the directory in which the table is stored
+        :type directory: str
+        :param language: The language of the utterances
+        :type language: str
+        :param profile: The spacy models used, see load_model()
+        :type profile: str
+
+        :returns: The path of the table, see vector_table.VectorTable
+        :rtype: str
+    """
+    import spacy
+
+    name = settings.dic_spacy_profiles[profile][language]
+    meta = spacy.util.get_model_meta(spacy.util.get_package_path(name))
+    vector_table_path = get_vector_table_path(directory, meta)
+
+    # tables exported by previous versions had no keys
+    if not os.path.isfile(vector_table_path+".json") or not os.path.isfile(vector_table_path+"_keys.npy"):
+        # only the vocabulary and its vectors are needed
+        model = spacy.load(name, exclude=meta.get("components", meta["pipeline"]))
+        export_vector_table(model, vector_table_path)
+        print("Exported the vectors of "+name+" to '"+vector_table_path+".npy'")
+
+    return vector_table_path
+
+
+def get_embedding_settings(language, profile, fw, embedding_mode = "sum"):
+
+    """
+        :param language: The language of the utterances
+        :type language: str
+        :param profile: The spacy models used, see load_model()
+        :type profile: str
+        :param fw: The list of stop words
+        :type fw: set
+        :param embedding_mode: How the embeddings of the words of an utterance are combined, see Utterance.compute_simi()
+        :type embedding_mode: str
+
+        :returns: What the embeddings of the utterances depend on, recorded in the manifest
+        of the embedding stores (see embedding_store.create_embedding_store()), and their dimension
+        :rtype: dict
+    """
+    import spacy
+
+    name = settings.dic_spacy_profiles[profile][language]
+    meta = spacy.util.get_model_meta(spacy.util.get_package_path(name))
+    return {"language": language, "model": name, "version": meta["version"],
+            "components": [component for component in meta["pipeline"] if component in settings.spacy_components],
+            "stop_words": hashlib.sha1(" ".join(sorted(fw)).encode("utf-8")).hexdigest()[:8],
+            "embedding_mode": embedding_mode, "analysis_version": Utterance.analysis_version, "dim": meta["vectors"]["width"]}
+
+
+def create_age_embedding_store(directory, age, embedding_settings):
+
+    """
+        Create the embedding store of an age, with a row for each "Indice" of its modified table
+
+        :param directory: The name of the directory in which the modified tables are stored
+        :type directory: str
+        :param age: The target child age
+        :type age: int
+        :param embedding_settings: The settings of the embeddings, see get_embedding_settings()
+        :type embedding_settings: dict
 
+        :returns: Nothing
+        :rtype: None
+    """
+    indices = read_table("../Databases/"+directory+"/modified/"+str(age), ["Indice"])["Indice"]
+    rows = int(indices.max()) + 1 if len(indices) > 0 else 0
+    if create_embedding_store(get_embedding_store_path(directory, age), rows, embedding_settings):
+        print("Created the embedding store of the "+str(age)+" month age")
+
+
+def init_worker(directory, language, cache_size, embedding_mode, thresholds, spacy_profile = "accurate", vector_table_path = None):
+
+    """
+        Initialize a worker process of process_similarities(), the settings, the stop-words,
+        the vocabulary and the spacy model are charged only once for each worker
+
+        :param directory: The name of the directory in which the vocabulary is stored
+        :type directory: str
+        :param language: The language of the utterances
+        :type language: str
+        :param cache_size: Number of utterance analyses kept in memory by the worker, 0 disables the cache
+        :type cache_size: int
+        :param embedding_mode: How the embeddings of the words of an utterance are combined
+        :type embedding_mode: str
+        :param thresholds: The thresholds of the age of acquisition dictionnaries to charge
+        :type thresholds: int list
+        :param spacy_profile: The spacy models and components loaded, see load_model()
+        :type spacy_profile: str
+        :param vector_table_path: The table of the vectors of the model, memory-mapped by every worker, see get_vector_table()
+        :type vector_table_path: str
+
+        :returns: Nothing, the charged objects are kept in the worker global variables
+        :rtype: None
+    """
+    global worker_model
+    global worker_fw
+    global worker_vocabulary
+    global worker_cache
+    global worker_embedding_mode
+    global worker_vector_table
+
+    settings.init()
+    worker_fw = settings.get_stop_words(language)
+    worker_vocabulary = get_vocab(directory, thresholds)
+    worker_vector_table = VectorTable(vector_table_path) if vector_table_path is not None else None
+    worker_model = load_model(language, spacy_profile, worker_vector_table)
+    worker_cache = AnalysisCache(directory, language, worker_model, worker_fw, embedding_mode, cache_size) if cache_size > 0 else None
+    worker_embedding_mode = embedding_mode
 
-# charge and return the age of acquisition dictionnaries of children, considering
-# different thresholds
-def get_vocab(directory):
 
-    vocabularygloss1 = pickle.load( open("../Databases/"+directory+"/vocabulary/1.p", "rb" ) )
-    vocabularygloss3 = pickle.load( open("../Databases/"+directory+"/vocabulary/3.p", "rb" ) )
-    vocabularygloss10 = pickle.load( open("../Databases/"+directory+"/vocabulary/10.p", "rb" ) )
-    vocabularygloss20 = pickle.load( open("../Databases/"+directory+"/vocabulary/20.p", "rb" ) )
-    vocabularygloss50 = pickle.load( open("../Databases/"+directory+"/vocabulary/50.p", "rb" ) )
+# expand_shard() called in a worker process initialized by init_worker()
+def expand_shard_in_worker(age, shard, shards, directory, *, batch_size, n_process, seed, ngram_semantics, rand_ex_max_distance, storage, stream, baseline_samples):
 
-    return [vocabularygloss1, vocabularygloss3, vocabularygloss10, vocabularygloss20, vocabularygloss50]
+    df = None if stream else read_table("../Databases/"+directory+"/modified/"+str(age), pair_columns)
+    expand_shard(age, shard, shards, df, worker_model, worker_fw, directory, worker_vocabulary, batch_size = batch_size, n_process = n_process, seed = seed, cache = worker_cache, embedding_mode = worker_embedding_mode, ngram_semantics = ngram_semantics, rand_ex_max_distance = rand_ex_max_distance, storage = storage, vector_table = worker_vector_table, baseline_samples = baseline_samples)
 
 
-def expand_data(age, model, fw, directory, vocabulary_gloss):
+def expand_data(age, model, fw, directory, vocabulary_gloss, *, batch_size = 1000, n_process = 1, seed = None, shards = 1, cache = None, embedding_mode = "sum", ngram_semantics = "duplicates", rand_ex_max_distance = None, storage = "csv", stream = False, vector_table = None, embedding_settings = None, baseline_samples = 1):
 
     """
         Use pre-processed CHILDES data from CSV files (see retrieve_childes_data()),
@@ -297,207 +761,410 @@ def expand_data(age, model, fw, directory, vocabulary_gloss):
         :param directory: The name of the directory in which the CSV file containing
         the results will be saved, and in which pre-processed CSV are already stored
         :type directory: str
-        :param vocabulary_gloss: List of five dictionnaries mapping words to their age
-        of acquisition, according to different thresholds
-        :type vocabulary_gloss: list of dict{str:int}
-
-        :returns: Nothing, but the results are stored in a CSV file in the specified directory.
+        :param vocabulary_gloss: The ages of acquisition of words, according to different
+        thresholds (see get_vocab())
+        :type vocabulary_gloss: dict
+        :param batch_size: Number of utterances given at once to the spacy model
+        :type batch_size: int
+        :param n_process: Number of processes used by the spacy model to parse utterances
+        :type n_process: int
+        :param seed: Seed of the random selection of the "rand_in" and "rand_ex" utterances,
+        combined with the age and the shard so that each of them has its own random sequence
+        :type seed: int
+        :param shards: Number of groups of transcripts the age is split into, see expand_shard()
+        :type shards: int
+        :param cache: The analyses of already parsed utterances, None to parse every utterance
+        :type cache: utterance_cache.AnalysisCache
+        :param embedding_mode: How the embeddings of the words of an utterance are combined, see Utterance.compute_simi()
+        :type embedding_mode: str
+        :param ngram_semantics: How the n-grams common to both utterances are counted, see compute_similarity.get_simple_ngrams_nbr()
+        :type ngram_semantics: str
+        :param rand_ex_max_distance: If not None, the edit distances of the "rand_ex" couples greater than it
+        are not computed exactly, see compute_similarity.get_edit_distance()
+        :type rand_ex_max_distance: int
+        :param storage: Format of the results table, see storage.get_storage(), it should stay the same
+        when the process is restarted
+        :type storage: str
+        :param stream: If True, only the utterances of one shard and their random utterances are in memory
+        at a time, instead of all the utterances of the age
+        :type stream: bool
+        :param vector_table: The vectors the embeddings of the words are read from, None to read them from the model
+        :type vector_table: vector_table.VectorTable
+        :param embedding_settings: The settings of the embeddings, see get_embedding_settings(), if given
+        the embeddings of the utterances are saved in the embedding store of the age
+        :type embedding_settings: dict
+        :param baseline_samples: Number of "rand_in" and "rand_ex" utterances drawn for each couple,
+        they are all parsed once with the couples, only their similarities are computed for each of them
+        :type baseline_samples: int
+
+        :returns: Nothing, but the results are stored in a table in the specified directory.
         :rtype: None
 
     """
-    if os.path.isfile("../Databases/"+directory+"/results/"+str(age)+".csv"):
+    if find_table("../Databases/"+directory+"/results/"+str(age)) is not None:
         print("\n"+str(age)+" month age has already been treated")
         return
-    elif os.path.isfile("../Databases/"+directory+"/results/"+str(age)+"_processing.csv"):
-        os.remove("../Databases/"+directory+"/results/"+str(age)+"_processing.csv")
 
     print("\nCurrently computing similarities for "+str(age)+" month age")
 
-    df_final = pd.DataFrame(columns=get_column_names())
-    # saving empty dataframe to erase potential previous one
-    df_final.to_csv("../Databases/"+directory+"/results/"+str(age)+"_processing.csv", index=False, encoding='utf-8')
+    if embedding_settings is not None:
+        create_age_embedding_store(directory, age, embedding_settings)
+
+    if stream:
+        df = None
+        age_index = get_age_index("../Databases/"+directory+"/modified/"+str(age))
+    else:
+        df = read_table("../Databases/"+directory+"/modified/"+str(age), pair_columns)
+        age_index = df
+
+    # the index is shared by all the shards of the age
+    speaker_index = get_speaker_index(age_index)
+
+    for shard in range(shards):
+        expand_shard(age, shard, shards, df, model, fw, directory, vocabulary_gloss, batch_size = batch_size, n_process = n_process, seed = seed,
+                     speaker_index = speaker_index, cache = cache, embedding_mode = embedding_mode, ngram_semantics = ngram_semantics,
+                     rand_ex_max_distance = rand_ex_max_distance, storage = storage, age_index = age_index, vector_table = vector_table,
+                     baseline_samples = baseline_samples)
+
+    merge_shards(directory, age, shards, storage)
 
-    df = pd.read_csv("../Databases/"+directory+"/modified/"+str(age)+".csv",engine="python", encoding='utf-8')
 
-    with open("../Databases/"+directory+"/results/"+str(age)+"_processing.csv",'a', newline='',encoding='utf-8') as f:
-        writer = csv.writer(f)
-        previous_row = None
-        # df is specific to an age, and sub_df to a transcript
-        sub_df = None
-        previous_transcript_id = None
+def expand_shard(age, shard, shards, df, model, fw, directory, vocabulary_gloss, *, batch_size = 1000, n_process = 1, seed = None, speaker_index = None, cache = None, embedding_mode = "sum", ngram_semantics = "duplicates", rand_ex_max_distance = None, storage = "csv", age_index = None, vector_table = None, baseline_samples = 1):
 
-        # each row is an utterance
-        for (i, row) in df.iterrows():
-            # if its not the first row of df
-            if previous_row is not None:
+    """
+        Compute the similarities measures of the couples of utterances of one shard of an age,
+        a shard being a group of consecutive transcripts (see get_shards()).
+        Store the results inside a partial table, 'results/<age>_part<shard>', and the embeddings
+        of the utterances parsed in the embedding store of the age, if it exists.
+        Shards that are already done are not computed again, which allows to restart
+        the process without loosing what was previously generated.
+
+        :param age: The target child age.
+        :type age: int
+        :param shard: The number of the shard to compute, between 0 and shards-1
+        :type shard: int
+        :param shards: Number of shards the age is split into, it should stay the same
+        when the process is restarted
+        :type shards: int
+        :param df: All the pre-processed utterances of the age, the "rand_ex" utterances
+        are selected among all of them. If None, the couples and their random utterances are found
+        with age_index, and only their rows are read from the modified table of the age
+        :type df: pandas.DataFrame
+        :param speaker_index: The positions of the child and adult utterances of the age,
+        computed if not given (see get_speaker_index())
+        :type speaker_index: dict
+        :param age_index: The columns of all the utterances of the age needed to find the couples,
+        df itself or read if not given (see get_age_index())
+        :type age_index: pandas.DataFrame
+
+        .. seealso:: expand_data() for the other parameters
+    """
+    part_filename = "../Databases/"+directory+"/results/"+str(age)+"_part"+str(shard)
+    if os.path.isfile(part_filename+extensions[storage]):
+        print(str(age)+" month age, shard "+str(shard)+" has already been treated")
+        return
 
-                # check that two rows are from a target child and a parent
-                if check_couple(previous_row, row):
+    modified_path = "../Databases/"+directory+"/modified/"+str(age)
+    if age_index is None:
+        age_index = get_age_index(modified_path) if df is None else df
 
+    (start, stop) = get_shards(age_index, shards)[shard]
+    shard_df = age_index.iloc[start:stop]
 
-                    if sub_df is None or previous_transcript_id != previous_row.transcript_id:
-                        sub_df = df[df["transcript_id"]==previous_row.transcript_id]
-                        previous_transcript_id = previous_row.transcript_id
+    # the random sequence only depends on the seed, the age and the shard, not on the order in which they are treated
+    rng = np.random.default_rng() if seed is None else np.random.default_rng([seed, age, shard])
 
-                    # random condition inside the transcript, rand_in_row and row
-                    # are from parent and child but not necessarily consecutives
-                    rand_in_row = get_random(sub_df, previous_row)
-                    # randon condition outside the transcript, rand_in_row and row
-                    # are from parent and child but might not be from the same transcript
-                    rand_ex_row = get_random(df, previous_row)
+    if speaker_index is None:
+        speaker_index = get_speaker_index(age_index)
 
-                    # chi->par or par-chi condition, the two utterances are consecutives
+    # the couples and their random utterances are selected first, so that only the needed utterances are read and parsed
+    positions = []
 
-                    data = get_data(previous_row, row, vocabulary_gloss, model, fw, "normal")
-                    writer.writerow(list(data.values()))
+    # positions of the utterances of each couple of consecutive child and parent utterances
+    (firsts, seconds) = get_couples(shard_df)
 
-                    data = get_data(previous_row, rand_in_row, vocabulary_gloss, model, fw, "rand_in")
-                    writer.writerow(list(data.values()))
+    # the speaker and transcript of the first utterance of each couple, selected at once
+    first_rows = age_index[["transcript_id", "speaker_code"]].iloc[firsts + start].itertuples(index=False)
 
-                    data = get_data(previous_row, rand_ex_row, vocabulary_gloss, model, fw, "rand_ex")
-                    writer.writerow(list(data.values()))
+    for (first, second, previous_row) in zip(firsts + start, seconds + start, first_rows):
+        # a "rand_in" and a "rand_ex" utterance for each sample
+        randoms = []
+        for sample in range(baseline_samples):
+            # random condition inside the transcript, rand_in_row and row
+            # are from parent and child but not necessarily consecutives
+            randoms.append(get_random(speaker_index["transcripts"][previous_row.transcript_id], previous_row, rng))
+            # randon condition outside the transcript, rand_in_row and row
+            # are from parent and child but might not be from the same transcript
+            randoms.append(get_random(speaker_index, previous_row, rng))
 
+        positions.append((first, second, *randoms))
 
+    wanted = np.unique(np.array(positions, dtype=int).ravel())
+    rows = df.loc[wanted] if df is not None else read_rows(modified_path, wanted, pair_columns)
+    # each row is converted once to a tuple, whose attributes are much faster to read than those of a pandas.Series
+    records = dict(zip(rows.index, rows.itertuples(index=False)))
+    couples = [tuple(records[position] for position in couple) for couple in positions]
 
-            previous_row = row
+    utterances = expand_utterances(rows, model, fw, batch_size = batch_size, n_process = n_process, cache = cache, embedding_mode = embedding_mode, vector_table = vector_table)
 
-    # change name of the current results file, to indicate
-    # that processing is done and the file is complete and won't need to be erased
-    # if the generation has to be stopped and rerun again
-    os.rename("../Databases/"+directory+"/results/"+str(age)+"_processing.csv", "../Databases/"+directory+"/results/"+str(age)+".csv")
+    # the embeddings of all the parsed utterances, saved so that other similarities can be computed without parsing them again,
+    # and normalized once so that the semantic similarities of a whole batch of couples are computed at once
+    embedding_rows = {indice: i for (i, indice) in enumerate(utterances)}
+    embeddings = [utterance.embedding_gloss for utterance in utterances.values()]
+    store_path = get_embedding_store_path(directory, age)
+    if embeddings and os.path.isfile(store_path+".json"):
+        write_embeddings(store_path, list(utterances), np.array(embeddings, dtype=np.float32))
+    embeddings = get_normalized_embeddings(embeddings)
 
+    # the table only gets its final name once complete, so that it won't need to be erased if the generation has to be stopped and rerun again
+    sink = ResultSink(part_filename, storage, get_result_schema(vocabulary_gloss["thresholds"]), results_flush_rows, results_flush_seconds)
+    # each couple gives 1 + 2 * baseline_samples lines, the batches are made smaller accordingly
+    batch_couples = max(1, couples_batch_size // baseline_samples)
+    for batch_start in range(0, len(couples), batch_couples):
+        batch = []
+        # rows of the embeddings of the two utterances of each line of batch
+        firsts = []
+        seconds = []
 
-def get_random(df, row):
+        for (previous_row, row, *random_rows) in couples[batch_start:batch_start+batch_couples]:
+            previous_utt = utterances[previous_row.Indice]
+
+            # chi->par or par-chi condition, the two utterances are consecutives
+            batch.append(get_data(previous_row, row, previous_utt, utterances[row.Indice], vocabulary_gloss, "normal", ngram_semantics, rand_ex_max_distance))
+            seconds.append(embedding_rows[row.Indice])
+
+            # the random utterances of each sample, in the same order as they were drawn
+            for sample in range(baseline_samples):
+                (rand_in_row, rand_ex_row) = random_rows[2*sample:2*sample+2]
+                batch.append(get_data(previous_row, rand_in_row, previous_utt, utterances[rand_in_row.Indice], vocabulary_gloss, "rand_in", ngram_semantics, rand_ex_max_distance, sample))
+                batch.append(get_data(previous_row, rand_ex_row, previous_utt, utterances[rand_ex_row.Indice], vocabulary_gloss, "rand_ex", ngram_semantics, rand_ex_max_distance, sample))
+                seconds += [embedding_rows[rand_in_row.Indice], embedding_rows[rand_ex_row.Indice]]
+
+            firsts += [embedding_rows[previous_row.Indice]] * (1 + 2 * baseline_samples)
+
+        for (data, semantic_similarity) in zip(batch, get_cosine_similarities(embeddings, firsts, seconds)):
+            data["semantic_similarity"] = semantic_similarity
+            sink.add(data)
+
+    sink.close()
+
+
+def get_shards(df, shards):
 
     """
-        Try to find an utterance in df that has been prononced by a child if row
-        has been prononced by an adult, and by an adult if row has been prononced
-        by a child
+        Split the utterances of an age into groups of consecutive transcripts of similar sizes,
+        so that couples of utterances are never split between two shards
+
+        :param df: All the pre-processed utterances of an age, sorted by transcript
+        :type df: pandas.DataFrame
+        :param shards: The number of shards
+        :type shards: int
+
+        :returns: The first (included) and last (excluded) row positions of each shard,
+        a shard might be empty if there are less transcripts than shards
+        :rtype: list[(int, int)]
+    """
+    # positions of the first utterance of each transcript
+    transcript_starts = df["transcript_id"].ne(df["transcript_id"].shift()).to_numpy().nonzero()[0].tolist() + [len(df)]
+
+    bounds = [0]
+    for shard in range(1, shards):
+        target = len(df) * shard / shards
+        bounds.append(max(bounds[-1], next(start for start in transcript_starts if start >= target)))
+    bounds.append(len(df))
+
+    return [(bounds[shard], bounds[shard+1]) for shard in range(shards)]
 
-        :param df: a DataFrame that contain either all the data of a transcript, or
-        all the data of all corpuses of a specific language in CHILDES
-        :type age: pandas.DataFrame
-        :param row: a specific row of df, which represent an utterance
-        :type row: pandas.core.series.Series
 
-        :returns: Nothing, but the results are stored in a CSV file in the specified directory.
+def merge_shards(directory, age, shards, storage = "csv"):
+
+    """
+        Concatenate the partial tables of the shards of an age into the final
+        'results/<age>' table, which only appears once it is complete
+
+        :param directory: The name of the directory in which the results are stored
+        :type directory: str
+        :param age: The target child age.
+        :type age: int
+        :param shards: Number of shards the age has been split into
+        :type shards: int
+        :param storage: Format of the partial and final tables, see storage.get_storage()
+        :type storage: str
+
+        :returns: Nothing, the partial files are removed once merged
         :rtype: None
+    """
+    results = "../Databases/"+directory+"/results/"+str(age)
+    parts = [results+"_part"+str(shard) for shard in range(shards)]
+    concatenate_tables(parts, results, storage)
+
+    for part in parts:
+        os.remove(part+extensions[storage])
+
+
+def expand_utterances(df, model, fw, *, batch_size = 1000, n_process = 1, cache = None, embedding_mode = "sum", vector_table = None):
 
     """
-    cpt_fail = 0
-    # if the utterance described by row has been prononced by a parent
-    if row.speaker_code in settings.adult_cond:
-        res_row = None
-        while res_row is None or res_row.speaker_code in settings.child_cond:
-            # select a random row in df
-            res_row = df.iloc[randint(0, len(df)-1)]
-            cpt_fail += 1
-            if cpt_fail > 1000:
-                raise Exception("Too much attempts to find a fitting random utterance")
+        Parse every utterance of df with the spacy model, streaming them by batches
+        through model.pipe(). Utterances sharing the same modified gloss are parsed
+        only once, and utterances already analysed in cache are not parsed again.
+
+        :param df: a DataFrame containing all the pre-processed utterances of an age
+        :type df: pandas.DataFrame
+        :param model: The spacy model that will be used to create embeddings of utterances,
+        tokenise them and create parts of speech
+        :type model: spacy.lang.en.English (or other languages)
+        :param fw: The list of stop words retrieved from Spacy
+        :type fw: set
+        :param batch_size: Number of utterances given at once to the spacy model
+        :type batch_size: int
+        :param n_process: Number of processes used by the spacy model to parse utterances
+        :type n_process: int
+        :param cache: The analyses of already parsed utterances, None to parse every utterance
+        :type cache: utterance_cache.AnalysisCache
+        :param embedding_mode: How the embeddings of the words of an utterance are combined, see Utterance.compute_simi()
+        :type embedding_mode: str
+        :param vector_table: The vectors the embeddings of the words are read from, None to read them from the model
+        :type vector_table: vector_table.VectorTable
+
+        :returns: The expanded utterances, indexed by the "Indice" of their row
+        :rtype: dict{int:Utterance}
+    """
+    utterances = {}
+    # utterances sharing the same modified gloss, the first one of each list is parsed
+    same_gloss = {}
+    for row in df.itertuples(index=False):
+        utterance = Utterance(row.gloss, row.speaker_id, row.type)
+        utterances[row.Indice] = utterance
+        same_gloss.setdefault(utterance.modified_gloss, []).append(utterance)
+
+    to_parse = []
+    for gloss in same_gloss:
+        analysis = cache.get(gloss) if cache is not None else None
+        if analysis is None:
+            to_parse.append(gloss)
+        else:
+            for utterance in same_gloss[gloss]:
+                utterance.set_analysis(analysis)
+
+    start = time.time()
+    docs = model.pipe(to_parse, batch_size=batch_size, n_process=n_process)
+    for gloss, doc in zip(to_parse, docs):
+        first = same_gloss[gloss][0]
+        first.expand_doc(doc, fw, embedding_mode, vector_table)
+        for utterance in same_gloss[gloss][1:]:
+            utterance.copy_analysis(first)
+        if cache is not None:
+            cache.put(gloss, first.get_analysis())
+
+    if to_parse:
+        duration = time.time() - start
+        print("Parsed "+str(len(to_parse))+" utterances with "+model.meta["name"]+" in "+str(round(duration, 1))+"s ("
+              +str(round(len(to_parse) / max(duration, 1e-6)))+" utterances per second), "+str(len(same_gloss)-len(to_parse))+" found in the cache")
+
+    if cache is not None:
+        cache.flush()
+
+    return utterances
+
+
+def get_age_index(modified_path):
+
+    """
+        :param modified_path: The path of the modified table of an age, without extension
+        :type modified_path: str
+
+        :returns: The columns of all the utterances of the age needed to find the couples and
+        their random utterances, indexed by the positions of the utterances in the table
+        :rtype: pandas.DataFrame
+    """
+    age_index = read_table(modified_path, index_columns)
+    # a few speakers codes are repeated for all the utterances
+    age_index["speaker_code"] = age_index["speaker_code"].astype("category")
+    return age_index
+
+
+def get_speaker_index(df):
+
+    """
+        Index the positions of the child and adult utterances of df, in the whole
+        DataFrame and in each transcript, so that random utterances can be selected
+        directly among the utterances of the right speaker
+
+        :param df: all the pre-processed utterances of an age
+        :type df: pandas.DataFrame
+
+        :returns: the positions of the "child" and "adult" utterances of df, and the same
+        positions for each transcript in "transcripts"
+        :rtype: dict{str:numpy.ndarray([int]), "transcripts":dict{int:dict{str:numpy.ndarray([int])}}}
+    """
+    is_child = df["speaker_code"].isin(settings.child_cond).to_numpy()
+    is_adult = df["speaker_code"].isin(settings.adult_cond).to_numpy()
 
-        return res_row
+    speaker_index = {"child": np.flatnonzero(is_child), "adult": np.flatnonzero(is_adult), "transcripts": {}}
+    for (transcript_id, positions) in df.groupby("transcript_id", sort=False).indices.items():
+        speaker_index["transcripts"][transcript_id] = {"child": positions[is_child[positions]], "adult": positions[is_adult[positions]]}
 
+    return speaker_index
+
+
+def get_random(speaker_index, row, rng):
+
+    """
+        Select at random the position of an utterance that has been prononced by a child
+        if row has been prononced by an adult, and by an adult if row has been prononced
+        by a child
+
+        :param speaker_index: the positions of the child and adult utterances, either of a transcript,
+        or of all the data of all corpuses of a specific language in CHILDES (see get_speaker_index())
+        :type speaker_index: dict{str:numpy.ndarray([int])}
+        :param row: the utterance for which a random counterpart is searched
+        :type row: pandas.Series or tuple (see pandas.DataFrame.itertuples())
+        :param rng: The random generator used to select the utterance
+        :type rng: numpy.random.Generator
+
+        :returns: The position of the selected utterance in the DataFrame of the age
+        :rtype: int
+    """
+    # if the utterance described by row has been prononced by a parent
+    if row.speaker_code in settings.adult_cond:
+        positions = speaker_index["child"]
     # if the utterance described by row has been prononced by a child
     else:
-        res_row = None
-        while res_row is None or res_row.speaker_code in settings.adult_cond:
-            # select a random row in df
-            res_row = df.iloc[randint(0, len(df)-1)]
-            cpt_fail += 1
-            if cpt_fail > 1000:
-                raise Exception("Too much attempts to find a fitting random utterance")
-
-        return res_row
-
-
-# check if two utterances, here rows of a Dataframe, are in the same transcript,
-# are consecutives, and were prononced by a child and an adult
-def check_couple(row1, row2):
-
-    try:
-        if row1.transcript_id != row2.transcript_id:
-            raise Exception("Utterances are not from the same transcript")
-        if not ((row1.speaker_code in settings.child_cond and row2.speaker_code in settings.adult_cond) or (row1.speaker_code in settings.adult_cond and row2.speaker_code in settings.child_cond)):
-            raise Exception("Utterances do not share a chi->par or par->chi relation")
-        if abs(row1.utterance_order - row2.utterance_order) != 1:
-            raise Exception("Utterances are not consecutives")
-    except:
-        return False
-    return True
-
-
-# return the name of the column of the final CSV file containing all the results,
-# like for exemple linguistic similarities measures.
-def get_column_names():
-
-    return ["condition",
-          "child_age",
-          "child_sex",
-          "child_id",
-          "parent_sex",
-          "child_utterance_order",
-          "adult_utterance_order",
-          "child_transcript_id",
-          "adult_transcript_id",
-          "child_corpus_name",
-          "adult_corpus_name",
-
-          "semantic_similarity",
-          "editdistance",
-
-          "child_utt",
-          "adult_utt",
-
-          "child_tokens",
-          "adult_tokens",
-
-          "child_tokens_nbr",
-          "adult_tokens_nbr",
-
-          "child_num_morphemes",
-          "adult_num_morphemes",
-
-          "child_pos",
-          "adult_pos",
-
-          "child_pos_nbr",
-          "adult_pos_nbr",
-
-          "child_unknown_words",
-          "adult_unknown_words",
-
-          "child_unknown_words_nbr",
-          "adult_unknown_words_nbr",
-
-          "child_stopwords",
-          "adult_stopwords",
-
-          "child_stopwords_nbr",
-          "adult_stopwords_nbr",
-
-          "child_final_tokens",
-          "adult_final_tokens",
-
-          "child_final_tokens_nbr",
-          "adult_final_tokens_nbr",
-
-          "lexical_unigrams_nbr",
-          "lexical_bigrams_nbr",
-          "lexical_trigrams_nbr",
-          "syntax_unigrams_nbr",
-          "syntax_bigrams_nbr",
-          "syntax_trigrams_nbr",
-          "syntax_minus_lexic_bigrams_nbr",
-          "syntax_minus_lexic_trigrams_nbr",
-
-          "out_of_child_vocab_nbr_1",
-          "ooc_vocab_words_1",
-          "out_of_child_vocab_nbr_3",
-          "ooc_vocab_words_3",
-          "out_of_child_vocab_nbr_10",
-          "ooc_vocab_words_10",
-          "out_of_child_vocab_nbr_20",
-          "ooc_vocab_words_20",
-          "out_of_child_vocab_nbr_50",
-          "ooc_vocab_words_50"
-          ]
+        positions = speaker_index["adult"]
+
+    return positions[rng.integers(len(positions))]
+
+
+def get_couples(df):
+
+    """
+        Find all the couples of utterances of df that are in the same transcript,
+        are consecutives, and were prononced by a child and an adult, in one pass
+        over the columns of df
+
+        :param df: pre-processed utterances, sorted by transcript and utterance order
+        :type df: pandas.DataFrame
+
+        :returns: The positions in df of the first and of the second utterance of each couple
+        :rtype: numpy.ndarray([int]), numpy.ndarray([int])
+    """
+    transcript_id = df["transcript_id"].to_numpy()
+    utterance_order = df["utterance_order"].to_numpy()
+    is_child = df["speaker_code"].isin(settings.child_cond).to_numpy()
+    is_adult = df["speaker_code"].isin(settings.adult_cond).to_numpy()
+
+    # each utterance is compared to the following one
+    same_transcript = transcript_id[:-1] == transcript_id[1:]
+    child_and_adult = (is_child[:-1] & is_adult[1:]) | (is_adult[:-1] & is_child[1:])
+    consecutives = abs(utterance_order[1:] - utterance_order[:-1]) == 1
+
+    firsts = np.flatnonzero(same_transcript & child_and_adult & consecutives)
+
+    return firsts, firsts + 1
+
+
+# return the name of the column of the final file containing all the results, see compute_similarity.get_result_schema()
+def get_column_names(thresholds = (1, 3, 10, 20, 50)):
+
+    return list(get_result_schema(thresholds))
@@ -1,26 +1,72 @@
 #!/usr/bin/python
 
 import sys
-from generate_database import process_similarities
+import argparse
 
-if len(sys.argv) < 5:
-    sys.exit("Not enough arguments")
 
-if sys.argv[2] not in ["English", "French", "Spanish", "German", "Chinese", "Japanese"]:
-    sys.exit("Language should be either: English, French, Spanish, German, Chinese, Japanese")
+def main():
 
-if int(sys.argv[3]) < 10:
-    sys.exit("Too low min_age: min:10")
-if int(sys.argv[4]) < 10:
-    sys.exit("Too low max_age: min:10")
+    parser = argparse.ArgumentParser(description="Compute the linguistic similarities of CHILDES utterances")
+    parser.add_argument("directory")
+    parser.add_argument("language")
+    parser.add_argument("age_min", type=int)
+    parser.add_argument("age_max", type=int)
+    parser.add_argument("test", nargs="?", default="False")
+    parser.add_argument("--workers", type=int, default=1, help="number of ages processed in parallel")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random baselines")
+    parser.add_argument("--shards", type=int, default=1, help="number of groups of transcripts each age is split into")
+    parser.add_argument("--cache_size", type=int, default=100000, help="number of utterance analyses kept in memory, 0 disables the cache")
+    parser.add_argument("--embedding_mode", default="sum", choices=["sum", "mean", "l2"], help="how the word embeddings of an utterance are combined")
+    parser.add_argument("--ngram_semantics", default="duplicates", choices=["duplicates", "multiset"], help="how the common n-grams of two utterances are counted")
+    parser.add_argument("--rand_ex_max_distance", type=int, default=None, help="edit distances of rand_ex couples above it are not computed exactly")
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[1, 3, 10, 20, 50], help="thresholds (in percent) of the ages of acquisition of words")
+    parser.add_argument("--batch_size", type=int, default=1000, help="number of utterances parsed at once by spacy")
+    parser.add_argument("--n_process", type=int, default=1, help="number of processes used by spacy to parse an age")
+    parser.add_argument("--retrieval_workers", type=int, default=4, help="number of ages retrieved from CHILDES at the same time")
+    parser.add_argument("--storage", default="parquet", choices=["parquet", "csv"], help="format of the raw, modified and results tables")
+    parser.add_argument("--stream", action="store_true", help="read the utterances of an age shard by shard to bound the memory used")
+    parser.add_argument("--spacy_profile", default="accurate", choices=["accurate", "fast"], help="large (accurate) or medium (fast) spacy models")
+    parser.add_argument("--baseline_samples", type=int, default=1, help="number of rand_in and rand_ex utterances drawn for each couple")
+    args = parser.parse_args()
 
-if int(sys.argv[3]) > 80:
-    sys.exit("Too high min_age: max:80")
-if int(sys.argv[4]) > 80:
-    sys.exit("Too high max_age: max:80")
+    if args.language not in ["English", "French", "Spanish", "German", "Chinese", "Japanese"]:
+        sys.exit("Language should be either: English, French, Spanish, German, Chinese, Japanese")
 
-if len(sys.argv) > 5 and (sys.argv[5] != "True" and sys.argv[5] != "False"):
-    print("test should be either True or False")
+    if args.age_min < 10:
+        sys.exit("Too low min_age: min:10")
+    if args.age_max < 10:
+        sys.exit("Too low max_age: min:10")
 
-test = sys.argv[5] == "True"
-process_similarities(sys.argv[1], sys.argv[2], age_min = int(sys.argv[3]), age_max = int(sys.argv[4]), test = test)
+    if args.age_min > 80:
+        sys.exit("Too high min_age: max:80")
+    if args.age_max > 80:
+        sys.exit("Too high max_age: max:80")
+
+    if args.test != "True" and args.test != "False":
+        print("test should be either True or False")
+
+    if args.workers < 1:
+        sys.exit("Too low workers: min:1")
+    if args.shards < 1:
+        sys.exit("Too low shards: min:1")
+    if args.retrieval_workers < 1:
+        sys.exit("Too low retrieval_workers: min:1")
+    if args.baseline_samples < 1:
+        sys.exit("Too low baseline_samples: min:1")
+
+    test = args.test == "True"
+
+    # imported once the arguments are checked, so that wrong arguments are reported at once
+    from generate_database import process_similarities
+    process_similarities(args.directory, args.language, age_min = args.age_min, age_max = args.age_max, test = test,
+                         batch_size = args.batch_size, n_process = args.n_process, workers = args.workers, seed = args.seed, shards = args.shards,
+                         cache_size = args.cache_size, embedding_mode = args.embedding_mode,
+                         ngram_semantics = args.ngram_semantics, rand_ex_max_distance = args.rand_ex_max_distance,
+                         thresholds = args.thresholds, retrieval_workers = args.retrieval_workers,
+                         storage = args.storage, stream = args.stream,
+                         spacy_profile = args.spacy_profile, baseline_samples = args.baseline_samples)
+
+
+# the guard is needed as worker processes re-import this module on Windows
+if __name__ == "__main__":
+    main()
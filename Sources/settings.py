@@ -1,9 +1,5 @@
-from spacy.lang.fr.stop_words import STOP_WORDS as STOP_WORDS_en
-from spacy.lang.es.stop_words import STOP_WORDS as STOP_WORDS_es
-from spacy.lang.zh.stop_words import STOP_WORDS as STOP_WORDS_zh
-from spacy.lang.ja.stop_words import STOP_WORDS as STOP_WORDS_ja
-from spacy.lang.de.stop_words import STOP_WORDS as STOP_WORDS_de
-from spacy.lang.fr.stop_words import STOP_WORDS as STOP_WORDS_fr
+import os
+import importlib
 
 def init():
     """
@@ -16,8 +12,13 @@ def init():
     global father_cond
     global unknown
 
+    global rscript
+
     global dic_childes
     global dic_spacy
+    global dic_spacy_fast
+    global dic_spacy_profiles
+    global spacy_components
     global dic_SW
 
     # speaker identifiers name used in the CHILDES corpus
@@ -27,9 +28,28 @@ def init():
     father_cond = ["FAT", "DAD", "PAP", "PAD", "VAT"]
     unknown = "ADU"
 
+    # path of the Rscript executable used to retrieve the CHILDES data, can be set with the RSCRIPT environment variable
+    rscript = os.environ.get("RSCRIPT", r"C:\Program Files\R\R-3.6.1\bin\Rscript")
+
     # names of the languages in the childes database
     dic_childes = {"English" : "eng", "Spanish" : "spa", "Chinese" : "zho", "Japanese" : "jpn", "German" : "deu", "French" : "fra"}
     # names of the spacy's corpus for each language
     dic_spacy = {"English" : "en_core_web_lg", "Spanish" : "es_core_news_lg", "Chinese" : "zh_core_web_lg", "Japanese" : "ja_core_news_lg", "German" : "de_core_news_lg", "French" : "fr_core_news_lg"}
-    # names of the spacy's stop_words list for each language
-    dic_SW = {"English" : STOP_WORDS_en, "Spanish" : STOP_WORDS_es, "Chinese" : STOP_WORDS_zh, "Japanese" : STOP_WORDS_ja, "German" : STOP_WORDS_de, "French" : STOP_WORDS_fr}
+    # smaller spacy's corpus, with vectors, for the "fast" profile
+    dic_spacy_fast = {"English" : "en_core_web_md", "Spanish" : "es_core_news_md", "Chinese" : "zh_core_web_md", "Japanese" : "ja_core_news_md", "German" : "de_core_news_md", "French" : "fr_core_news_md"}
+    dic_spacy_profiles = {"accurate" : dic_spacy, "fast" : dic_spacy_fast}
+    # components of the spacy's pipelines giving the parts of speech, the only ones loaded (see generate_database.load_model())
+    spacy_components = ["tok2vec", "tagger", "attribute_ruler", "morphologizer"]
+    # names of the spacy's stop_words modules for each language, only the one of the chosen language is imported, see get_stop_words()
+    dic_SW = {"English" : "en", "Spanish" : "es", "Chinese" : "zh", "Japanese" : "ja", "German" : "de", "French" : "fr"}
+
+
+def get_stop_words(language):
+    """
+        :param language: The language of the utterances
+        :type language: str
+
+        :returns: The spacy's stop-words of the language
+        :rtype: set
+    """
+    return importlib.import_module("spacy.lang."+dic_SW[language]+".stop_words").STOP_WORDS
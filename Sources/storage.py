@@ -0,0 +1,433 @@
+import io
+import os
+import glob
+import time
+import shutil
+import numpy as np
+import pandas as pd
+
+# pyarrow is only needed to store the tables as Parquet files, CSV files are used without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# extension of the files of each storage format
+extensions = {"parquet": ".parquet", "csv": ".csv"}
+# number of rows of the row groups of the Parquet files, read_rows() only reads the row groups containing the rows wanted
+parquet_row_group_size = 10000
+
+
+def get_storage(storage = "parquet"):
+
+    """
+        :param storage: The storage format requested, either "parquet" or "csv"
+        :type storage: str
+
+        :returns: The storage format that will be used, CSV if Parquet is requested but pyarrow isn't installed
+        :rtype: str
+    """
+    if storage not in extensions:
+        raise ValueError("Unknown storage: "+str(storage)+", should be either: "+", ".join(extensions))
+
+    if storage == "parquet" and pa is None:
+        print("pyarrow is not installed, the tables will be stored as CSV files")
+        return "csv"
+
+    return storage
+
+
+def find_table(path):
+
+    """
+        :param path: The path of a table, without extension
+        :type path: str
+
+        :returns: The path of the file of the table, in whichever storage format it has been written, None if there is none
+        :rtype: str
+    """
+    for extension in extensions.values():
+        if os.path.isfile(path+extension):
+            return path+extension
+    return None
+
+
+def list_tables(folder):
+
+    """
+        :param folder: The path of a folder
+        :type folder: str
+
+        :returns: The paths, without extension, of all the complete tables of the folder, in alphabetical order
+        :rtype: list[str]
+    """
+    paths = set()
+    for extension in extensions.values():
+        for filename in glob.glob(folder+"/*"+extension):
+            if not filename.endswith("_processing"+extension):
+                paths.add(filename[:-len(extension)])
+    return sorted(paths)
+
+
+def read_table(path, columns = None):
+
+    """
+        :param path: The path of a table, without extension, stored either as a Parquet or a CSV file
+        :type path: str
+        :param columns: The columns to read, all of them if None
+        :type columns: list[str]
+
+        :returns: The table
+        :rtype: pandas.DataFrame
+    """
+    filename = find_table(path)
+    if filename is None:
+        raise FileNotFoundError("No table found at '"+path+"'")
+
+    if filename.endswith(extensions["parquet"]):
+        return pd.read_parquet(filename, columns=columns)
+    return pd.read_csv(filename, usecols=columns, encoding='utf-8', low_memory=False)
+
+
+def iter_table(path, columns = None, chunk_size = 100000):
+
+    """
+        Read a table chunk by chunk, so that it never needs to be entirely in memory
+
+        :param path: The path of a table, without extension, stored either as a Parquet or a CSV file
+        :type path: str
+        :param columns: The columns to read, all of them if None
+        :type columns: list[str]
+        :param chunk_size: The number of rows of each chunk
+        :type chunk_size: int
+
+        :returns: The successive chunks of the table, each one indexed by the positions of its rows in the table
+        :rtype: generator[pandas.DataFrame]
+    """
+    filename = find_table(path)
+    if filename is None:
+        raise FileNotFoundError("No table found at '"+path+"'")
+
+    if filename.endswith(extensions["parquet"]):
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(filename).iter_batches(batch_size=chunk_size, columns=columns))
+    else:
+        chunks = pd.read_csv(filename, usecols=columns, encoding='utf-8', chunksize=chunk_size)
+
+    start = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(start, start+len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def count_rows(path):
+
+    """
+        :param path: The path of a table, without extension, stored either as a Parquet or a CSV file
+        :type path: str
+
+        :returns: The number of rows of the table, read from the metadata of a Parquet file,
+        by reading only the first column of a CSV file
+        :rtype: int
+    """
+    filename = find_table(path)
+    if filename is None:
+        raise FileNotFoundError("No table found at '"+path+"'")
+
+    if filename.endswith(extensions["parquet"]):
+        return pq.ParquetFile(filename).metadata.num_rows
+    return sum(len(chunk) for chunk in pd.read_csv(filename, usecols=[0], encoding='utf-8', chunksize=100000))
+
+
+def get_row_offsets(path):
+
+    """
+        The offset index of a CSV table, computed once and kept in '<path>_offsets.npy'.
+        A row can span several lines if a quoted value contains a line break,
+        a line starts a new row only if the quotes before it are all closed.
+
+        :param path: The path of a table stored as a CSV file, without extension
+        :type path: str
+
+        :returns: The position, in bytes, of the start of each row of the file, and of its end
+        :rtype: numpy.ndarray([int64])
+    """
+    filename = path+extensions["csv"]
+    offsets_filename = path+"_offsets.npy"
+    if os.path.isfile(offsets_filename) and os.path.getmtime(offsets_filename) >= os.path.getmtime(filename):
+        return np.load(offsets_filename)
+
+    offsets = []
+    with open(filename, 'rb') as f:
+        position = len(f.readline())
+        quotes = 0
+        for line in f:
+            if quotes % 2 == 0:
+                offsets.append(position)
+            quotes += line.count(b'"')
+            position += len(line)
+    offsets.append(position)
+    offsets = np.array(offsets, dtype=np.int64)
+
+    # the temporary file is named after the process, in case several processes compute the index at the same time
+    processing_filename = path+"_offsets_processing_"+str(os.getpid())+".npy"
+    np.save(processing_filename, offsets)
+    os.replace(processing_filename, offsets_filename)
+    return offsets
+
+
+def read_rows(path, positions, columns = None):
+
+    """
+        Read only some rows of a table: the row groups containing them in a Parquet file,
+        their bytes in a CSV file, found with its offset index (see get_row_offsets())
+
+        :param path: The path of a table, without extension, stored either as a Parquet or a CSV file
+        :type path: str
+        :param positions: The positions of the rows to read
+        :type positions: numpy.ndarray([int])
+        :param columns: The columns to read, all of them if None
+        :type columns: list[str]
+
+        :returns: The rows, indexed by their positions in the table, in ascending order
+        :rtype: pandas.DataFrame
+
+        .. warning:: With a Parquet file, a whole row group is decoded as soon as one of its rows is wanted
+    """
+    filename = find_table(path)
+    if filename is None:
+        raise FileNotFoundError("No table found at '"+path+"'")
+    positions = np.unique(positions)
+
+    if filename.endswith(extensions["parquet"]):
+        table = pq.ParquetFile(filename)
+        # position of the first row of each row group, and end of the last one
+        starts = np.cumsum([0] + [table.metadata.row_group(i).num_rows for i in range(table.num_row_groups)])
+        rows = []
+        for group in np.unique(np.searchsorted(starts, positions, side="right") - 1):
+            chunk = table.read_row_group(group, columns=columns).to_pandas()
+            chunk.index = pd.RangeIndex(starts[group], starts[group+1])
+            rows.append(chunk.loc[positions[(positions >= starts[group]) & (positions < starts[group+1])]])
+        # without any row wanted, the columns are still those of the table
+        return pd.concat(rows) if rows else table.schema_arrow.empty_table().to_pandas()[columns or slice(None)]
+
+    offsets = get_row_offsets(path)
+    with open(filename, 'rb') as f:
+        data = [f.readline()]
+        for position in positions:
+            f.seek(offsets[position])
+            row = f.read(offsets[position+1] - offsets[position])
+            # the last row of the file might not end with a line break
+            data.append(row if row.endswith(b"\n") else row+b"\n")
+    rows = pd.read_csv(io.BytesIO(b"".join(data)), usecols=columns, encoding='utf-8')
+    rows.index = positions
+    return rows
+
+
+def write_table(df, path, storage):
+
+    """
+        Write a table under a temporary name, renamed once complete, so that an interrupted run never leaves a truncated table
+
+        :param df: The table
+        :type df: pandas.DataFrame
+        :param path: The path of the table, without extension
+        :type path: str
+        :param storage: The storage format, see get_storage()
+        :type storage: str
+
+        :returns: The path of the file written
+        :rtype: str
+    """
+    extension = extensions[storage]
+    if storage == "parquet":
+        df.to_parquet(path+"_processing"+extension, index=False, row_group_size=parquet_row_group_size)
+    else:
+        df.to_csv(path+"_processing"+extension, index=False, encoding='utf-8')
+
+    os.replace(path+"_processing"+extension, path+extension)
+    return path+extension
+
+
+def get_arrow_type(kind):
+
+    """
+        :param kind: The type of a column: "str", "int", "float" or "str_list"
+        :type kind: str
+
+        :returns: The corresponding Arrow type
+        :rtype: pyarrow.DataType
+    """
+    return {"str": pa.string(), "int": pa.int64(), "float": pa.float64(), "str_list": pa.list_(pa.string())}[kind]
+
+
+def get_typed_column(column, values, kind):
+
+    """
+        :param column: The name of the column, used in the error messages
+        :type column: str
+        :param values: The values of the column
+        :type values: list
+        :param kind: The type of the column, see get_arrow_type()
+        :type kind: str
+
+        :returns: The values in an array of the right type, integers are nullable so that
+        missing values don't turn them into floats, lists are written "['a', 'b']" in CSV files
+        :rtype: pandas.api.extensions.ExtensionArray or pandas.Series
+
+        .. warning:: Raise a ValueError if a value doesn't match the type of the column
+    """
+    try:
+        if kind == "int":
+            return pd.array(values, dtype="Int64")
+        if kind == "float":
+            return pd.array(values, dtype="float64")
+        if kind == "str":
+            wrong = next((value for value in values if not isinstance(value, str) and not pd.isna(value)), None)
+            if wrong is not None:
+                raise TypeError("not a string: "+repr(wrong))
+            return pd.Series(values, dtype=object)
+        if kind == "str_list":
+            # numpy arrays and numpy strings would be written with their repr in CSV files
+            return pd.Series([None if value is None else [str(item) for item in value] for value in values], dtype=object)
+    except (TypeError, ValueError) as error:
+        raise ValueError("Column '"+column+"' should contain values of type "+kind+": "+str(error))
+    raise ValueError("Unknown type of column '"+column+"': "+str(kind))
+
+
+class ResultSink:
+
+    """
+    Write a table row by row, the rows being accumulated column by column and written in batches,
+    under a temporary name renamed once the table is complete (see close()).
+    The rows are checked against the schema of the table: a row with missing or unexpected columns,
+    or a value of the wrong type, raises a ValueError.
+
+    :param path: The path of the table, without extension
+    :type path: str
+    :param storage: The storage format, see get_storage()
+    :type storage: str
+    :param schema: The type of each column (see get_arrow_type()), in order
+    :type schema: dict{str:str}
+    :param flush_rows: Number of rows after which the accumulated rows are written
+    :type flush_rows: int
+    :param flush_seconds: Time after which the accumulated rows are written, whatever their number
+    :type flush_seconds: float
+
+    :ivar buffers: The values of the rows not yet written, for each column
+    :vartype buffers: dict{str:list}
+    """
+
+    def __init__(self, path, storage, schema, flush_rows = 30000, flush_seconds = 60):
+
+        self.path = path
+        self.storage = storage
+        self.schema = schema
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.filename = path+"_processing"+extensions[storage]
+
+        self.buffers = {column: [] for column in schema}
+        self.rows = 0
+        self.last_flush = time.monotonic()
+
+        if storage == "parquet":
+            self.writer = pq.ParquetWriter(self.filename, pa.schema([(column, get_arrow_type(kind)) for (column, kind) in schema.items()]))
+        else:
+            self.writer = open(self.filename, 'w', newline='', encoding='utf-8')
+            self.writer.write(",".join(schema)+"\n")
+
+
+    def add(self, row):
+        """
+            :param row: The value of each column of the schema
+            :type row: dict{str:object}
+
+            :returns: Nothing
+            :rtype: None
+        """
+        if len(row) != len(self.schema) or row.keys() != self.schema.keys():
+            missing = [column for column in self.schema if column not in row]
+            unexpected = [column for column in row if column not in self.schema]
+            raise ValueError("Row not matching the schema, missing columns: "+str(missing)+", unexpected columns: "+str(unexpected))
+
+        for (column, value) in row.items():
+            self.buffers[column].append(value)
+        self.rows += 1
+
+        if self.rows >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+
+    def flush(self):
+        """
+            Write the accumulated rows
+
+            :returns: Nothing
+            :rtype: None
+        """
+        if self.rows > 0:
+            df = pd.DataFrame({column: get_typed_column(column, values, self.schema[column]) for (column, values) in self.buffers.items()})
+            if self.storage == "parquet":
+                self.writer.write_table(pa.Table.from_pandas(df, schema=self.writer.schema, preserve_index=False))
+            else:
+                df.to_csv(self.writer, header=False, index=False)
+
+        self.buffers = {column: [] for column in self.schema}
+        self.rows = 0
+        self.last_flush = time.monotonic()
+
+
+    def close(self):
+        """
+            Write the remaining rows and rename the table once complete
+
+            :returns: The path of the file written
+            :rtype: str
+        """
+        self.flush()
+        self.writer.close()
+        os.replace(self.filename, self.path+extensions[self.storage])
+        return self.path+extensions[self.storage]
+
+
+def concatenate_tables(paths, path, storage):
+
+    """
+        Concatenate tables with the same columns into a single one, which only appears once complete
+
+        :param paths: The paths of the tables to concatenate, without extension
+        :type paths: list[str]
+        :param path: The path of the resulting table, without extension
+        :type path: str
+        :param storage: The storage format of all the tables, see get_storage()
+        :type storage: str
+
+        :returns: The path of the file written
+        :rtype: str
+    """
+    extension = extensions[storage]
+    if storage == "parquet":
+        writer = None
+        for part_path in paths:
+            part = pq.ParquetFile(part_path+extension)
+            if writer is None:
+                writer = pq.ParquetWriter(path+"_processing"+extension, part.schema_arrow)
+            for batch in part.iter_batches():
+                writer.write_batch(batch)
+        writer.close()
+    else:
+        with open(path+"_processing"+extension, 'wb') as f:
+            for (i, part_path) in enumerate(paths):
+                with open(part_path+extension, 'rb') as part:
+                    header = part.readline()
+                    # the header is kept only once
+                    if i == 0:
+                        f.write(header)
+                    shutil.copyfileobj(part, f)
+
+    os.replace(path+"_processing"+extension, path+extension)
+    return path+extension
@@ -1,6 +1,17 @@
 import re
 import numpy as np
-from operator import add
+from collections import Counter
+
+# flags of the tokens of an utterance, see Utterance.classify_tokens()
+STOP_WORD = 1
+UNKNOWN_WORD = 2
+KEPT_WORD = 4
+
+# the n-grams of an utterance are computed at once for all n up to NGRAMS_MAX_N
+NGRAMS_MAX_N = 3
+
+# words used in the CHILDES corpus to indicate that the speaker word was not recognizable
+UNRECOGNIZABLE_WORDS = {"xxx", "xxxx", "yyy", "yyyy"}
 
 
 class Utterance:
@@ -30,6 +41,9 @@ class Utterance:
     :ivar length_gloss: The number of tokens in tokens_gloss
     :vartype length_gloss: int
 
+    :ivar flags_gloss: The flags of each token of tokens_gloss: function word, unknown word or kept word
+    :vartype flags_gloss: numpy.ndarray([uint8])
+
     :ivar gloss_stopw: A string array reprensentation of the function words found in tokens_gloss
     :vartype gloss_stopw: numpy.ndarray([str])
     :ivar gloss_stopw_nbr: The number of function words in tokens_gloss
@@ -47,8 +61,23 @@ class Utterance:
 
     :ivar embedding_gloss: The 300 dimension embedding representing the utterance, minus its function words and unknown words
     :vartype embedding_gloss: numpy.ndarray([float]*300)
+    :ivar pos_gloss: The part of speech of each token in tokens_gloss
+    :vartype pos_gloss: numpy.ndarray([str])
+    :ivar ngrams: The number of occurences of each n-gram of tokens_gloss and pos_gloss, see get_ngrams()
+    :vartype ngrams: dict{(str, int):collections.Counter}
+    :ivar token_ids: tokens_gloss where each token is replaced by an integer id, see get_token_ids()
+    :vartype token_ids: list[int]
     """
 
+    # attributes set by expand(), they only depend on modified_gloss
+    analysis_attributes = ["tokens_gloss", "length_gloss", "flags_gloss",
+                           "gloss_stopw", "gloss_stopw_nbr",
+                           "gloss_unknowns", "gloss_unknowns_nbr",
+                           "final_tokens_gloss", "final_tokens_gloss_nbr",
+                           "embedding_gloss", "pos_gloss"]
+    # to be increased each time the content of the analyses changes, so that cached analyses are not reused
+    analysis_version = 2
+
     def __init__(self, gloss, speaker_id, typeu):
 
         self.original_gloss = gloss
@@ -59,6 +88,8 @@ class Utterance:
         self.tokens_gloss = None
         self.length_gloss = None
 
+        self.flags_gloss = None
+
         self.gloss_stopw = None
         self.gloss_stopw_nbr = None
 
@@ -70,6 +101,11 @@ class Utterance:
 
         self.embedding_gloss = None
 
+        self.pos_gloss = None
+
+        self.ngrams = {}
+        self.token_ids = None
+
 
     def modify(self, s):
         """
@@ -88,7 +124,7 @@ class Utterance:
         return " ".join(re.sub("_", ' ', s).split())
 
 
-    def expand(self, model, stop_words):
+    def expand(self, model, stop_words, embedding_mode = "sum", vector_table = None):
 
         """
             Pre-process data in preparation for the linguistic similarities measurements
@@ -99,6 +135,10 @@ class Utterance:
             :type model: spacy.lang.eng.English (or other language)
             :param stop_words: The list of function words
             :type stop_words: set
+            :param embedding_mode: How the embeddings of the words are combined, see compute_simi()
+            :type embedding_mode: str
+            :param vector_table: The table the embeddings of the words are read from, see compute_simi()
+            :type vector_table: vector_table.VectorTable
 
             :returns: Nothing, all changes are saved in the utterance's attributes
             :rtype: None
@@ -107,80 +147,176 @@ class Utterance:
         # tokenisation
         # tmp_gloss is a Spacy object: spacy.tokens.doc.Doc
         tmp_gloss = model(self.modified_gloss)
+        self.expand_doc(tmp_gloss, stop_words, embedding_mode, vector_table)
+
+
+    def expand_doc(self, tmp_gloss, stop_words, embedding_mode = "sum", vector_table = None):
+
+        """
+            Same as expand(), but from an already tokenized utterance, which allows
+            to parse many utterances at once with model.pipe()
+
+            :param tmp_gloss: The Spacy object resulting of the parsing of modified_gloss
+            :type tmp_gloss: spacy.tokens.doc.Doc
+            :param stop_words: The list of function words
+            :type stop_words: set
+            :param embedding_mode: How the embeddings of the words are combined, see compute_simi()
+            :type embedding_mode: str
+            :param vector_table: The table the embeddings of the words are read from, see compute_simi()
+            :type vector_table: vector_table.VectorTable
+
+            :returns: Nothing, all changes are saved in the utterance's attributes
+            :rtype: None
+
+            .. seealso:: generate_database.expand_utterances()
+        """
+
         self.tokens_gloss = list(map(str,tmp_gloss))
         self.length_gloss = len(self.tokens_gloss)
 
-        # finding function words
-        self.gloss_stopw = self.get_stop_words(self.tokens_gloss, stop_words)
+        # finding function words and unknown words, in a single pass over the tokens
+        self.flags_gloss = self.classify_tokens(tmp_gloss, stop_words)
+
+        self.gloss_stopw = self.select_tokens(STOP_WORD)
         self.gloss_stopw_nbr = len(self.gloss_stopw)
 
-        # finding unknown words
-        self.gloss_unknowns = self.get_unknowns(tmp_gloss)
+        self.gloss_unknowns = self.select_tokens(UNKNOWN_WORD)
         self.gloss_unknowns_nbr = len(self.gloss_unknowns)
 
-        # removing function words and unknown words from the tokens
-        self.final_tokens_gloss = self.remove_tokens(self.tokens_gloss, self.gloss_stopw, self.gloss_unknowns)
+        # the tokens that are neither function words nor unknown words
+        self.final_tokens_gloss = self.select_tokens(KEPT_WORD)
         self.final_tokens_gloss_nbr = len(self.final_tokens_gloss)
 
         # creating the embedding
-        self.embedding_gloss = self.compute_simi(self.final_tokens_gloss, tmp_gloss)
+        self.embedding_gloss = self.compute_simi(self.final_tokens_gloss, tmp_gloss, embedding_mode, vector_table)
 
         # creating the part of speech
         self.pos_gloss = np.array([str(token.pos_) for token in tmp_gloss])
 
 
-    def get_stop_words(self, str_array, sw_list):
+    def copy_analysis(self, utterance):
         """
-            Find every function words (stop words) listed in sw_list that are present in str_array
+            Copy the results of expand() from another utterance sharing the same modified_gloss,
+            so that identical utterances don't need to be parsed several times
 
-            :param str_array: array of words found in the original utterance
-            :type str_array: numpy.ndarray([str])
-            :param sw_list: The list of function words
-            :type sw_list: set
+            :param utterance: An already expanded utterance with the same modified_gloss
+            :type utterance: Utterance
 
-            :returns: A string array reprensentation of the function words found in str_array
-            :rtype: numpy.ndarray([str])
+            :returns: Nothing, all changes are saved in the utterance's attributes
+            :rtype: None
         """
-        res = np.array([word for word in str_array if word in sw_list])
+        self.set_analysis(utterance.get_analysis())
 
-        return res
 
+    def get_analysis(self):
+        """
+            :returns: The results of expand(), which only depend on modified_gloss
+            :rtype: dict{str:object}
+
+            .. seealso:: utterance_cache.AnalysisCache
+        """
+        return {attribute: getattr(self, attribute) for attribute in self.analysis_attributes}
+
+
+    def set_analysis(self, analysis):
+        """
+            Set the results of expand() from a previously computed analysis
+
+            :param analysis: The analysis of an utterance with the same modified_gloss, see get_analysis()
+            :type analysis: dict{str:object}
+
+            :returns: Nothing, all changes are saved in the utterance's attributes
+            :rtype: None
+        """
+        for attribute in self.analysis_attributes:
+            setattr(self, attribute, analysis[attribute])
+
+
+    def get_ngrams(self, level, n):
+        """
+            Count the n-grams of the utterance, the n-grams of every size up to NGRAMS_MAX_N
+            are computed in a single pass over the utterance, and kept for later calls
+
+            :param level: "tokens" for the lexical n-grams (of tokens_gloss), "pos" for the syntactic n-grams (of pos_gloss)
+            :type level: str
+            :param n: n defines the n in ngram
+            :type n: int
+
+            :returns: The number of occurences of each n-gram of the utterance
+            :rtype: collections.Counter{tuple(str):int}
+        """
+        if (level, n) not in self.ngrams:
+            sequence = [str(value) for value in (self.tokens_gloss if level == "tokens" else self.pos_gloss)]
+            sizes = range(1, max(n, NGRAMS_MAX_N)+1)
+            counters = {size: Counter() for size in sizes}
+            for i in range(len(sequence)):
+                for size in sizes:
+                    if i + size > len(sequence):
+                        break
+                    counters[size][tuple(sequence[i:i+size])] += 1
+            for size in sizes:
+                self.ngrams[(level, size)] = counters[size]
+
+        return self.ngrams[(level, n)]
+
+
+    def get_token_ids(self, token_vocabulary):
+        """
+            Replace each token of tokens_gloss by an integer id, which allows faster comparisons of token sequences
+
+            :param token_vocabulary: The ids of the tokens already met, new tokens are added to it
+            :type token_vocabulary: dict{str:int}
 
-    def get_unknowns(self, str_tokens):
+            :returns: The id of each token of tokens_gloss
+            :rtype: list[int]
         """
-            Find every unknown words that are present in str_tokens
+        if self.token_ids is None:
+            self.token_ids = [token_vocabulary.setdefault(token, len(token_vocabulary)) for token in self.tokens_gloss]
+
+        return self.token_ids
+
+
+    def classify_tokens(self, str_tokens, sw_list):
+        """
+            Flag in one pass every token of str_tokens as a function word (stop word),
+            an unknown word, and/or a word kept for the embedding.
+            Unknown words are the tokens that are not out of the Spacy model vocabulary,
+            and the words used in CHILDES to indicate unrecognizable speech: "xxx", "xxxx", "yyy", "yyyy".
+            A token is kept if it is neither a function word nor an unknown word.
 
             :param str_tokens: array of tokens (Spacy object) found in the original utterance
             :type str_tokens: spacy.tokens.doc.Doc
+            :param sw_list: The list of function words
+            :type sw_list: set
 
-            :returns: A string array reprensentation of the unknown words found in str_tokens
-            :rtype: numpy.ndarray([str])
+            :returns: The flags of each token, a combination of STOP_WORD, UNKNOWN_WORD and KEPT_WORD
+            :rtype: numpy.ndarray([uint8])
         """
-        res = np.array([str(word) for word in str_tokens if not word.is_oov or str(word) == "xxx" or str(word) == "xxxx" or str(word) == "yyy" or str(word) == "yyyy"])
+        flags = []
+        for token in str_tokens:
+            word = str(token)
+            token_flags = 0
+            if word in sw_list:
+                token_flags |= STOP_WORD
+            if not token.is_oov or word in UNRECOGNIZABLE_WORDS:
+                token_flags |= UNKNOWN_WORD
+            flags.append(token_flags if token_flags else KEPT_WORD)
 
-        return res
+        return np.array(flags, dtype=np.uint8)
 
 
-    def remove_tokens(self, str_array, stop_words, unknowns):
+    def select_tokens(self, flag):
         """
-            Find every unknown words that are present in str_tokens
-
-            :param str_array: array of words found in the original utterance
-            :type str_array: numpy.ndarray([str])
-            :param stop_words: A list of the function words found in str_array
-            :type stop_words: numpy.ndarray([str])
-            :param unknowns: A list of the unknown words found in str_array
-            :type unknowns: numpy.ndarray([str])
+            :param flag: STOP_WORD, UNKNOWN_WORD or KEPT_WORD
+            :type flag: int
 
-            :returns: A string array representation of the tokens present in str_array, from which unknowns and function words have been removed
+            :returns: A string array representation of the tokens of tokens_gloss having the flag, duplicates included
             :rtype: numpy.ndarray([str])
         """
-        res = np.array([word for word in list(str_array) if word not in list(stop_words) and word not in list(unknowns)])
-
-        return res
+        return np.array([word for (word, flags) in zip(self.tokens_gloss, self.flags_gloss) if flags & flag])
 
 
-    def compute_simi(self, str_array, str_tokens):
+    def compute_simi(self, str_array, str_tokens, mode = "sum", vector_table = None):
 
         """
             Create a 300 dimension embedding representing the utterance
@@ -189,18 +325,39 @@ class Utterance:
             :type str_array: numpy.ndarray([str])
             :param str_tokens: array of tokens (Spacy object) found in the original utterance
             :type str_tokens: spacy.tokens.doc.Doc
-
-            :returns: A 300 dimension vector, sum of the embeddings linked to each words contained in str_array
-            :rtype: numpy.ndarray([float]*300)
+            :param mode: "sum" to sum the embeddings linked to each words contained in str_array,
+            "mean" to average them, or "l2" to sum them and normalize the result
+            :type mode: str
+            :param vector_table: The table the embeddings of the words are read from, in a single lookup,
+            None to read them from the tokens
+            :type vector_table: vector_table.VectorTable
+
+            :returns: A 300 dimension vector combining the embeddings linked to each words contained in str_array,
+            only zeros if str_array is empty
+            :rtype: numpy.ndarray([float32]*300)
         """
-        # create an embedding for each word in str_tokens
-        dict_word_vector = {}
-        res = np.array([0]*300)
-        for token in str_tokens:
-            dict_word_vector[str(token)] = token.vector
-
-        # successively add each embedding linked to a word in str_array
-        for word in str_array:
-            res = np.array(list(map(add, list(dict_word_vector[word]), list(res))))
+        if len(str_array) == 0:
+            return np.zeros(str_tokens.vocab.vectors_length, dtype=np.float32)
+
+        if vector_table is not None:
+            keys = vector_table.get_keys(str_tokens)
+            res = vector_table.get_vectors([keys[word] for word in str_array]).sum(axis=0)
+        else:
+            # create an embedding for each word in str_tokens
+            dict_word_vector = {}
+            for token in str_tokens:
+                dict_word_vector[str(token)] = token.vector
+
+            # add at once each embedding linked to a word in str_array
+            res = np.array([dict_word_vector[word] for word in str_array], dtype=np.float32).sum(axis=0)
+
+        if mode == "mean":
+            res /= len(str_array)
+        elif mode == "l2":
+            norm = np.linalg.norm(res)
+            if norm > 0:
+                res /= norm
+        elif mode != "sum":
+            raise ValueError("Unknown embedding mode: "+str(mode))
 
         return res
@@ -0,0 +1,115 @@
+import pickle
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from utterance import Utterance
+
+
+class AnalysisCache:
+
+    """
+    Cache of the analyses made by Utterance.expand(), so that an utterance that has already been
+    parsed, in any transcript, age or previous run, doesn't need to be parsed again.
+    Analyses are identified by the language, the spacy model (name, version and components), the stop-words,
+    the embedding mode and the modified gloss of the utterance. The most recently used ones are kept in memory,
+    and all of them are persisted in 'Databases/<directory>/cache/analyses.sqlite'.
+
+    :param directory: The name of the database directory in which the cache is persisted
+    :type directory: str
+    :param language: The language of the utterances
+    :type language: str
+    :param model: The spacy model used to parse the utterances
+    :type model: spacy.lang.en.English (or other languages)
+    :param stop_words: The list of function words
+    :type stop_words: set
+    :param embedding_mode: How the embeddings of the words are combined, see Utterance.compute_simi()
+    :type embedding_mode: str
+    :param max_size: Maximum number of analyses kept in memory, the least recently used are discarded first
+    :type max_size: int
+
+    :ivar key: Identify the language, model and its components, stop-words, embedding mode and version of Utterance.expand() the analyses were made with
+    :vartype key: str
+    :ivar analyses: The analyses kept in memory, indexed by modified gloss, from the least to the most recently used
+    :vartype analyses: collections.OrderedDict{str:dict}
+    :ivar new_analyses: Analyses not yet persisted on disk, see flush()
+    :vartype new_analyses: dict{str:dict}
+    """
+
+    def __init__(self, directory, language, model, stop_words, embedding_mode = "sum", max_size = 100000):
+
+        # a change of stop-words changes the analyses, hence the digest in the key
+        stop_words_digest = hashlib.sha1(" ".join(sorted(stop_words)).encode("utf-8")).hexdigest()[:8]
+        self.key = "_".join([language, model.meta["lang"], model.meta["name"], model.meta["version"], "+".join(model.pipe_names),
+                             stop_words_digest, embedding_mode, "v"+str(Utterance.analysis_version)])
+
+        self.max_size = max_size
+        self.analyses = OrderedDict()
+        self.new_analyses = {}
+
+        # several worker processes can share the same file, sqlite handles the locks
+        self.connection = sqlite3.connect("../Databases/"+directory+"/cache/analyses.sqlite", timeout=600)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS analyses (key TEXT, gloss TEXT, analysis BLOB, PRIMARY KEY (key, gloss))")
+        self.connection.commit()
+
+
+    def get(self, gloss):
+        """
+            :param gloss: The modified gloss of an utterance
+            :type gloss: str
+
+            :returns: The analysis of the utterance if it has already been made, None otherwise
+            :rtype: dict{str:object}
+        """
+        if gloss in self.analyses:
+            self.analyses.move_to_end(gloss)
+            return self.analyses[gloss]
+
+        row = self.connection.execute("SELECT analysis FROM analyses WHERE key = ? AND gloss = ?", (self.key, gloss)).fetchone()
+        if row is None:
+            return None
+
+        analysis = pickle.loads(row[0])
+        self.remember(gloss, analysis)
+        return analysis
+
+
+    def put(self, gloss, analysis):
+        """
+            Add a new analysis to the cache, it will be persisted at the next call of flush()
+
+            :param gloss: The modified gloss of an utterance
+            :type gloss: str
+            :param analysis: The analysis of the utterance, see Utterance.get_analysis()
+            :type analysis: dict{str:object}
+
+            :returns: Nothing
+            :rtype: None
+        """
+        self.remember(gloss, analysis)
+        self.new_analyses[gloss] = analysis
+
+
+    def remember(self, gloss, analysis):
+        """
+            Keep an analysis in memory, discarding the least recently used one if the cache is full
+        """
+        self.analyses[gloss] = analysis
+        self.analyses.move_to_end(gloss)
+        if len(self.analyses) > self.max_size:
+            self.analyses.popitem(last=False)
+
+
+    def flush(self):
+        """
+            Persist on disk the analyses added since the last call
+
+            :returns: Nothing
+            :rtype: None
+        """
+        if not self.new_analyses:
+            return
+
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO analyses VALUES (?, ?, ?)",
+                                        [(self.key, gloss, pickle.dumps(analysis)) for (gloss, analysis) in self.new_analyses.items()])
+        self.new_analyses = {}
@@ -0,0 +1,131 @@
+import os
+import json
+import numpy as np
+
+
+class VectorTable:
+
+    """
+    Word vectors of a spacy model, exported once (see export_vector_table()) as a float32 array in
+    'Databases/<directory>/cache/vectors_<model>.npy'. The row of each word is found in '_keys.npy',
+    the sorted keys (spacy's hashes) of the words, and '_rows.npy', the row of each key.
+    The arrays are memory-mapped read-only: the worker processes all read them through the page cache,
+    instead of each one charging its own copy of the vectors of the model.
+
+    :param path: The path of the table, without extension, see get_vector_table_path()
+    :type path: str
+
+    :ivar vectors: The vectors, one row per vector, several words can share the same row
+    :vartype vectors: numpy.memmap([[float32]])
+    :ivar keys: The keys of the words having a vector, sorted
+    :vartype keys: numpy.memmap([uint64])
+    :ivar rows: The row of the vector of each key
+    :vartype rows: numpy.memmap([int64])
+    :ivar name: The name of the vectors in the spacy model
+    :vartype name: str
+    :ivar attr: The attribute of the tokens the keys are computed from (spacy's ORTH in general)
+    :vartype attr: int
+    """
+
+    def __init__(self, path):
+
+        with open(path+".json", encoding="utf-8") as f:
+            index = json.load(f)
+        self.path = path
+        self.name = index["name"]
+        self.attr = index["attr"]
+        self.vectors = np.load(path+".npy", mmap_mode="r")
+        self.keys = np.load(path+"_keys.npy", mmap_mode="r")
+        self.rows = np.load(path+"_rows.npy", mmap_mode="r")
+
+
+    def get_vectors(self, keys):
+        """
+            :param keys: The keys of the words, see get_keys()
+            :type keys: list[int]
+
+            :returns: The vector of each word, only zeros for the words without vector, as spacy does
+            :rtype: numpy.ndarray([[float32]])
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        if len(self.keys) == 0:
+            return np.zeros((len(keys), self.vectors.shape[1]), dtype=np.float32)
+
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        vectors = np.take(self.vectors, np.where(found, self.rows[positions], 0), axis=0)
+        vectors[~found] = 0
+        return vectors
+
+
+    def get_keys(self, doc):
+        """
+            :param doc: A parsed utterance
+            :type doc: spacy.tokens.doc.Doc
+
+            :returns: The key of the vector of each word of the utterance
+            :rtype: dict{str:int}
+        """
+        return dict(zip(map(str, doc), doc.to_array(self.attr).tolist()))
+
+
+    def attach(self, model):
+        """
+            Replace the vectors of a spacy model by the table, so that Token.is_oov and the components
+            using the vectors read them from the table. The model should have been charged without its vectors.
+            spacy itself needs the rows of the keys in a dict, as when it charges its own vectors.
+
+            :param model: The spacy model
+            :type model: spacy.lang.en.English (or other languages)
+
+            :returns: Nothing
+            :rtype: None
+        """
+        from spacy.vectors import Vectors
+
+        vectors = Vectors(strings=model.vocab.strings, data=self.vectors, name=self.name, attr=self.attr)
+        vectors.key2row = dict(zip(self.keys.tolist(), self.rows.tolist()))
+        model.vocab.vectors = vectors
+
+
+def get_vector_table_path(directory, meta):
+
+    """
+        :param directory: The name of the database directory in which the table is stored
+        :type directory: str
+        :param meta: The meta data of the spacy model, see spacy.util.get_model_meta()
+        :type meta: dict
+
+        :returns: The path of the table of the vectors of the model, without extension
+        :rtype: str
+    """
+    return "../Databases/"+directory+"/cache/vectors_"+meta["lang"]+"_"+meta["name"]+"-"+meta["version"]
+
+
+def export_vector_table(model, path):
+
+    """
+        Write the vectors of a spacy model as a table that VectorTable can memory-map,
+        the '.json' file being written last, so that an interrupted export is done again at the next run
+
+        :param model: The spacy model, charged with its vectors
+        :type model: spacy.lang.en.English (or other languages)
+        :param path: The path of the table, without extension, see get_vector_table_path()
+        :type path: str
+
+        :returns: Nothing
+        :rtype: None
+    """
+    vectors = model.vocab.vectors
+    keys = np.fromiter(vectors.key2row.keys(), dtype=np.uint64, count=len(vectors.key2row))
+    rows = np.fromiter(vectors.key2row.values(), dtype=np.int64, count=len(vectors.key2row))
+    # sorted, so that the row of a key is found by a binary search
+    order = np.argsort(keys)
+
+    for (suffix, array) in [("", np.asarray(vectors.data, dtype=np.float32)), ("_keys", keys[order]), ("_rows", rows[order])]:
+        np.save(path+suffix+"_processing.npy", array)
+        os.replace(path+suffix+"_processing.npy", path+suffix+".npy")
+
+    with open(path+"_processing.json", 'w', encoding="utf-8") as f:
+        json.dump({"name": vectors.name, "attr": int(vectors.attr)}, f)
+    os.replace(path+"_processing.json", path+".json")
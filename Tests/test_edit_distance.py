@@ -0,0 +1,41 @@
+import os
+import sys
+import random
+
+import nltk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sources"))
+
+from compute_similarity import get_edit_distance
+
+
+# utterances as token ids: a small vocabulary, so that the sequences share tokens, with a few edge cases
+# (empty utterances, identical ones, a single token, ids too large for a byte)
+CORPUS = [([], []), ([], [1]), ([1], []), ([1], [1]), ([1, 2, 3], [1, 2, 3]), ([1, 2, 3], [3, 2, 1]),
+          ([1, 2, 3, 4], [1, 3, 4]), ([1, 1, 1], [1, 1]), ([300, 70000], [300, 70001]), ([5] * 30, [5] * 29 + [6])]
+generator = random.Random(0)
+for _ in range(2000):
+    CORPUS.append(([generator.randrange(8) for _ in range(generator.randrange(12))],
+                   [generator.randrange(8) for _ in range(generator.randrange(12))]))
+
+MAX_DISTANCES = [0, 1, 2, 3, 5, 8]
+
+
+def test_edit_distance_matches_nltk():
+    for (ids_1, ids_2) in CORPUS:
+        assert get_edit_distance(ids_1, ids_2) == nltk.edit_distance(ids_1, ids_2), (ids_1, ids_2)
+
+
+def test_bounded_edit_distance_matches_nltk():
+    for (ids_1, ids_2) in CORPUS:
+        distance = nltk.edit_distance(ids_1, ids_2)
+        for max_distance in MAX_DISTANCES:
+            expected = distance if distance <= max_distance else max_distance + 1
+            assert get_edit_distance(ids_1, ids_2, max_distance) == expected, (ids_1, ids_2, max_distance)
+
+
+def test_null_max_distance_accepts_identical_utterances():
+    # editdistance.eval_criterion() rejects identical sequences with a null threshold, get_edit_distance() must not
+    for ids in [[], [1], [1, 2, 3], [300, 70000]]:
+        assert get_edit_distance(ids, list(ids), 0) == 0
+    assert get_edit_distance([1, 2], [1, 3], 0) == 1
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import subprocess
+
+# the modules are run from the Sources folder, as the paths of the databases are relative to it
+SOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sources")
+
+# start-up budgets, in seconds, measured with a fresh interpreter: a few times what they take on a laptop,
+# but far below the seconds spacy and gensim take to import
+RUN_INVALID_ARGUMENTS_BUDGET = 1.0
+IMPORT_BUDGET = 2.0
+
+
+def run_python(args):
+
+    """
+        :param args: The arguments given to a new python interpreter, started in the Sources folder
+        :type args: list[str]
+
+        :returns: The finished process, with its outputs, and the time it took
+        :rtype: (subprocess.CompletedProcess, float)
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable] + args, cwd=SOURCES, capture_output=True, text=True)
+    return process, time.perf_counter() - start
+
+
+def test_run_rejects_invalid_arguments_within_budget():
+    process, duration = run_python(["run.py", "test", "Klingon", "20", "21"])
+
+    assert process.returncode != 0
+    assert "Language should be either" in process.stderr
+    assert duration < RUN_INVALID_ARGUMENTS_BUDGET, "run.py took "+str(round(duration, 2))+"s to reject invalid arguments"
+
+
+def test_import_generate_database_within_budget_without_heavy_modules():
+    code = ("import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import generate_database\n"
+            "print(time.perf_counter() - start)\n"
+            "print(' '.join(module for module in ('spacy', 'gensim', 'win32api') if module in sys.modules))\n")
+    process, _ = run_python(["-c", code])
+
+    assert process.returncode == 0, process.stderr
+    (duration, loaded) = process.stdout.splitlines()
+    assert float(duration) < IMPORT_BUDGET, "generate_database took "+str(round(float(duration), 2))+"s to import"
+    assert loaded == "", "imported at start-up: "+loaded